@@ -0,0 +1,150 @@
+import logging
+import queue
+import threading
+import time
+from collections import Counter, defaultdict
+from datetime import datetime
+
+from models import db, WeatherQuery, CropCareQuery
+from user_stats import COUNTED_MODELS, record_bulk_activity
+
+# Audit models and the column holding when each row was logged
+TIMESTAMP_COLUMNS = {
+    WeatherQuery: 'queried_at',
+    CropCareQuery: 'queried_at',
+}
+
+class ActivityLogger:
+    """Write-behind logger for page-view audit rows.
+
+    Request threads call ``log()``, which only appends to an in-memory
+    queue. A single writer thread inserts the queued rows in one transaction
+    once ``max_batch`` rows are waiting or ``flush_interval`` seconds have
+    passed since the oldest one was queued, so browsing never waits on a
+    database write lock. ``close()`` writes whatever is still queued. When
+    more than ``max_queue`` rows are waiting, new rows are dropped. A batch
+    whose transaction fails is retried up to ``max_retries`` times, waiting
+    ``retry_delay`` seconds and doubling it each time, before its rows are
+    counted as dropped.
+    """
+
+    def __init__(self, app, max_batch=200, flush_interval=2.0, max_queue=10000,
+                 max_retries=3, retry_delay=0.5):
+        self.app = app
+        self.max_batch = max_batch
+        self.flush_interval = flush_interval
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._lock = threading.Lock()
+        self._stats = {
+            'queued': 0,
+            'written': 0,
+            'dropped': 0,
+            'batches': 0,
+            'errors': 0,
+            'retries': 0,
+            'total_flush_ms': 0.0,
+        }
+        self._thread = threading.Thread(target=self._run, name='activity-log', daemon=True)
+        self._thread.start()
+
+    def log(self, model, **values):
+        """Queue one audit row; its timestamp is taken now"""
+        values.setdefault(TIMESTAMP_COLUMNS[model], datetime.utcnow())
+        try:
+            self._queue.put_nowait((model, values))
+        except queue.Full:
+            with self._lock:
+                self._stats['dropped'] += 1
+            return
+        with self._lock:
+            self._stats['queued'] += 1
+
+    def flush(self, timeout=None):
+        """Write every row queued so far and wait for the transaction"""
+        done = threading.Event()
+        self._queue.put(done)
+        return done.wait(timeout)
+
+    def close(self):
+        """Write the remaining rows and stop the writer thread"""
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+
+    def get_metrics(self):
+        """Return queue depth, batch sizes and flush latency"""
+        with self._lock:
+            stats = dict(self._stats)
+        batches = stats['batches'] or 1
+        stats['queue_depth'] = self._queue.qsize()
+        stats['avg_batch_size'] = stats['written'] / batches
+        stats['avg_flush_ms'] = stats['total_flush_ms'] / batches
+        return stats
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            batch = []
+            waiters = []
+            deadline = time.monotonic() + self.flush_interval
+            while True:
+                if item is None:
+                    self._write(batch)
+                    return
+                if isinstance(item, threading.Event):
+                    waiters.append(item)
+                    break
+                batch.append(item)
+                if len(batch) >= self.max_batch:
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+
+            self._write(batch)
+            for waiter in waiters:
+                waiter.set()
+
+    def _write(self, batch):
+        if not batch:
+            return
+        started = time.perf_counter()
+        rows = defaultdict(list)
+        activity = defaultdict(Counter)
+        for model, values in batch:
+            rows[model].append(values)
+            activity[values['user_id']][COUNTED_MODELS[model]] += 1
+
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                time.sleep(self.retry_delay * 2 ** (attempt - 1))
+                with self._lock:
+                    self._stats['retries'] += 1
+            try:
+                with self.app.app_context():
+                    for user_id, counts in activity.items():
+                        record_bulk_activity(db.session, user_id, counts)
+                    for model, values in rows.items():
+                        db.session.execute(db.insert(model), values)
+                    db.session.commit()
+                break
+            except Exception as e:
+                logging.error(f"Error writing {len(batch)} activity rows (attempt {attempt + 1}): {e}")
+                with self._lock:
+                    self._stats['errors'] += 1
+        else:
+            logging.error(f"Dropping {len(batch)} activity rows after {self.max_retries + 1} attempts")
+            with self._lock:
+                self._stats['dropped'] += len(batch)
+            return
+
+        with self._lock:
+            self._stats['batches'] += 1
+            self._stats['written'] += len(batch)
+            self._stats['total_flush_ms'] += (time.perf_counter() - started) * 1000
@@ -0,0 +1,247 @@
+import json
+import logging
+import operator
+import re
+
+# Comparison operators available to rule conditions
+OPERATORS = {
+    '<': operator.lt,
+    '<=': operator.le,
+    '>': operator.gt,
+    '>=': operator.ge,
+    '==': operator.eq,
+    '!=': operator.ne,
+}
+
+# Matches the Celsius range in crop planting data, e.g. "60-70°F (15-21°C)"
+CELSIUS_RANGE = re.compile(r'(-?\d+(?:\.\d+)?)\s*-\s*(-?\d+(?:\.\d+)?)\s*°C')
+
+class Rule:
+    """A compiled advice rule"""
+
+    __slots__ = ('id', 'group', 'crop', 'advice', 'predicate')
+
+    def __init__(self, rule_id, group, crop, advice, predicate):
+        self.id = rule_id
+        self.group = group
+        self.crop = crop
+        self.advice = advice
+        self.predicate = predicate
+
+class Conditions:
+    """Weather values a rule set is evaluated against.
+
+    Forecast fields are turned into per-day columns on first use, so each
+    column is built once per evaluation no matter how many rules read it.
+    Days marked ``partial`` are skipped: a few 3-hour slots do not give a
+    day's real minimum, maximum or peak humidity.
+    """
+
+    __slots__ = ('current', 'forecast', 'results', '_columns')
+
+    def __init__(self, weather_data):
+        self.current = weather_data
+        self.forecast = [day for day in weather_data.get('forecast') or [] if not day.get('partial')]
+        self.results = {}
+        self._columns = {}
+
+    def column(self, field):
+        values = self._columns.get(field)
+        if values is None:
+            values = self._columns[field] = [day.get(field) for day in self.forecast]
+        return values
+
+def compile_test(op, value):
+    """Compile an operator and operand into a single-argument test"""
+    if op == 'contains':
+        needle = str(value).lower()
+        return lambda actual: actual is not None and needle in str(actual).lower()
+    if op == 'between':
+        low, high = value
+        return lambda actual: actual is not None and low <= actual <= high
+    compare = OPERATORS.get(op)
+    if compare is None:
+        raise ValueError(f"Unknown operator: {op}")
+    return lambda actual: actual is not None and compare(actual, value)
+
+def compile_condition(spec, compiled=None):
+    """Compile a condition spec into a predicate over Conditions.
+
+    Identical field conditions are compiled once and shared through
+    ``compiled``; their result is memoized per evaluation, so a condition
+    used by many rules is only tested once per request.
+    
+    A combinator carrying ``consecutive_days`` or ``all_days`` is tested day
+    by day: all of its conditions must hold on the same forecast days.
+    """
+    if compiled is None:
+        compiled = {}
+    
+    if ('all' in spec or 'any' in spec) and ('consecutive_days' in spec or 'all_days' in spec):
+        key = json.dumps(spec, sort_keys=True)
+        predicate = compiled.get(key)
+        if predicate is None:
+            day_test = compile_day_condition({'all': spec['all']} if 'all' in spec else {'any': spec['any']})
+            predicate = compiled[key] = memoize(key, lambda conditions: match_days(
+                map(day_test, conditions.forecast), spec.get('consecutive_days', 1), spec.get('all_days', False)
+            ))
+        return predicate
+    
+    if 'all' in spec:
+        parts = tuple(compile_condition(part, compiled) for part in spec['all'])
+        def all_of(conditions):
+            for part in parts:
+                if not part(conditions):
+                    return False
+            return True
+        return all_of
+    
+    if 'any' in spec:
+        parts = tuple(compile_condition(part, compiled) for part in spec['any'])
+        def any_of(conditions):
+            for part in parts:
+                if part(conditions):
+                    return True
+            return False
+        return any_of
+    
+    key = json.dumps(spec, sort_keys=True)
+    predicate = compiled.get(key)
+    if predicate is None:
+        predicate = compiled[key] = memoize(key, compile_field_condition(spec))
+    return predicate
+
+def memoize(key, predicate):
+    """Cache a predicate's result for the duration of one evaluation"""
+    def memoized(conditions):
+        result = conditions.results.get(key)
+        if result is None:
+            result = conditions.results[key] = predicate(conditions)
+        return result
+    return memoized
+
+def compile_day_condition(spec):
+    """Compile a condition over the fields of a single forecast day"""
+    if 'all' in spec:
+        parts = tuple(compile_day_condition(part) for part in spec['all'])
+        return lambda day: all(part(day) for part in parts)
+    
+    if 'any' in spec:
+        parts = tuple(compile_day_condition(part) for part in spec['any'])
+        return lambda day: any(part(day) for part in parts)
+    
+    if 'forecast' not in spec or 'consecutive_days' in spec or 'all_days' in spec:
+        raise ValueError(f"Per-day conditions must test one 'forecast' field: {spec}")
+    test = compile_test(spec['op'], spec['value'])
+    field = spec['forecast']
+    return lambda day: test(day.get(field))
+
+def match_days(matches, required=1, all_days=False):
+    """Whether per-day results hold on every day, or on ``required`` consecutive days"""
+    if all_days:
+        matched_any = False
+        for matched in matches:
+            if not matched:
+                return False
+            matched_any = True
+        return matched_any
+    
+    run = 0
+    for matched in matches:
+        run = run + 1 if matched else 0
+        if run >= required:
+            return True
+    return False
+
+def compile_field_condition(spec):
+    """Compile a single 'current' or 'forecast' field condition"""
+    test = compile_test(spec['op'], spec['value'])
+    
+    if 'current' in spec:
+        field = spec['current']
+        return lambda conditions: test(conditions.current.get(field))
+    
+    if 'forecast' in spec:
+        field = spec['forecast']
+        required = spec.get('consecutive_days', 1)
+        all_days = spec.get('all_days', False)
+        return lambda conditions: match_days(map(test, conditions.column(field)), required, all_days)
+    
+    raise ValueError(f"Condition must name a 'current' or 'forecast' field: {spec}")
+
+def crop_rules(crop_care_data):
+    """Derive crop-specific planting rules from the crop care soil temperatures"""
+    rules = []
+    for crop_name, crop_info in crop_care_data.items():
+        match = CELSIUS_RANGE.search(crop_info.get('planting', {}).get('soil_temp', ''))
+        if not match:
+            continue
+        low, high = float(match.group(1)), float(match.group(2))
+        rules.append({
+            'id': f'{crop_name.lower()}_planting_window',
+            'crop': crop_name,
+            'when': {'forecast': 'temp_mean', 'op': 'between', 'value': [low, high], 'consecutive_days': 3},
+            'advice': f"🌱 {crop_name}: The coming days stay within {low:g}-{high:g}°C, a good window for planting."
+        })
+        rules.append({
+            'id': f'{crop_name.lower()}_too_cold',
+            'crop': crop_name,
+            'when': {'forecast': 'temp_min', 'op': '<', 'value': low - 5},
+            'advice': f"🥶 {crop_name}: Nights well below {low:g}°C are expected. Delay planting or protect young plants."
+        })
+    return rules
+
+class RuleSet:
+    """Ordered, compiled advice rules.
+
+    Rules sharing a ``group`` are mutually exclusive: only the first matching
+    rule of a group contributes advice. Rules with a ``crop`` only apply when
+    advice is requested for that crop.
+    """
+
+    def __init__(self, specs, default=None):
+        self.default = default
+        self.rules = []
+        compiled = {}
+        for spec in specs:
+            try:
+                predicate = compile_condition(spec['when'], compiled)
+            except (KeyError, TypeError, ValueError) as e:
+                raise ValueError(f"Invalid advice rule {spec.get('id', '?')}: {e}") from e
+            self.rules.append(Rule(spec.get('id'), spec.get('group'), spec.get('crop'), spec['advice'], predicate))
+
+    def evaluate(self, weather_data, crop=None):
+        """Return the advice messages whose rules match the weather data"""
+        conditions = Conditions(weather_data)
+        advice = []
+        matched_groups = set()
+        for rule in self.rules:
+            if rule.crop is not None and rule.crop != crop:
+                continue
+            if rule.group is not None and rule.group in matched_groups:
+                continue
+            if rule.predicate(conditions):
+                advice.append(rule.advice)
+                if rule.group is not None:
+                    matched_groups.add(rule.group)
+        
+        if not advice and self.default:
+            return [self.default]
+        return advice
+
+def load_rules(rules_path, crop_care_path=None):
+    """Load and compile advice rules, adding crop rules from the crop care data"""
+    with open(rules_path, 'r', encoding='utf-8') as f:
+        spec = json.load(f)
+    
+    specs = list(spec.get('rules', []))
+    if crop_care_path:
+        try:
+            with open(crop_care_path, 'r', encoding='utf-8') as f:
+                specs.extend(crop_rules(json.load(f)))
+        except FileNotFoundError:
+            logging.warning(f"{crop_care_path} not found, skipping crop-specific advice rules")
+    
+    rule_set = RuleSet(specs, default=spec.get('default'))
+    logging.info(f"Compiled {len(rule_set.rules)} farming advice rules")
+    return rule_set
@@ -1,19 +1,41 @@
 import os
 import logging
-from flask import Flask, render_template, request, redirect, url_for, flash, session, jsonify
+import atexit
+from flask import Flask, render_template, request, redirect, url_for, flash, session, jsonify, Response, stream_with_context
 from flask_login import LoginManager, login_user, logout_user, login_required, current_user
 from werkzeug.security import check_password_hash, generate_password_hash
 from werkzeug.utils import secure_filename
 from PIL import Image
-import sqlite3
-from datetime import datetime
+from datetime import timezone
+import io
 import json
+import queue
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+from functools import partial
+import numpy as np
 
 # Import our modules
-from models import db, User, Detection, WeatherQuery, ChatHistory, CropCareQuery
-from plant_disease_model import load_model, preprocess_image, predict_disease
-from gemini_chat import get_ai_response
-from weather_service import get_weather_data
+from models import db, User, Detection, DetectionJob, DetectionReview, WeatherQuery, ChatHistory, CropCareQuery
+from plant_disease_model import load_model, preprocess_image, build_prediction, input_shape, DISEASE_CLASSES
+from inference_batcher import InferenceBatcher
+from detection_cache import DetectionCache, content_hash, perceptual_hash
+from detection_jobs import DetectionJobQueue, serialize_job, ACTIVE_STATUSES
+from detection_review import DetectionEscalator, serialize_review
+from database import database_url, engine_options
+from migrations import migrate
+from activity_log import ActivityLogger
+from pagination import keyset_page
+from user_stats import DashboardCache, load_user_stats, record_bulk_activity, track_activity
+from gemini_chat import get_ai_response, stream_ai_response, summarize_conversation, FALLBACK_RESPONSES, client as gemini
+from gemini_chat import analyze_plant_image_with_ai, format_ai_response, parse_diagnosis, IMAGE_FALLBACK_RESPONSES
+from chat_cache import ChatResponseCache, is_standalone, topic_vocabulary
+from chat_context import ConversationSummarizer, build_context, html_to_text
+from weather_service import get_weather_data, get_cache_stats, reload_advice_rules, CROP_CARE_PATH
+from crop_knowledge import CropKnowledgeStore
+from page_cache import RenderedPageCache, StaticFingerprints, latest_mtime
 
 # Configure logging
 logging.basicConfig(level=logging.DEBUG)
@@ -22,13 +44,81 @@ app = Flask(__name__)
 app.secret_key = os.environ.get("SESSION_SECRET", "dev-secret-key-change-in-production")
 
 # Database configuration
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///plant_disease_app.db'
+app.config['SQLALCHEMY_DATABASE_URI'] = database_url()
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(app.config['SQLALCHEMY_DATABASE_URI'])
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 app.config['UPLOAD_FOLDER'] = 'static/uploads'
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
 
+# Micro-batching for disease inference
+app.config['INFERENCE_MAX_BATCH_SIZE'] = int(os.environ.get('INFERENCE_MAX_BATCH_SIZE', 8))
+app.config['INFERENCE_MAX_WAIT_MS'] = float(os.environ.get('INFERENCE_MAX_WAIT_MS', 10))
+app.config['INFERENCE_QUEUE_DEPTH'] = int(os.environ.get('INFERENCE_QUEUE_DEPTH', 64))
+app.config['INFERENCE_TIMEOUT'] = float(os.environ.get('INFERENCE_TIMEOUT', 30))
+
+# Detection result cache keyed by image content; near-duplicate matching is opt-in
+app.config['DETECTION_CACHE_SIZE'] = int(os.environ.get('DETECTION_CACHE_SIZE', 1024))
+app.config['DETECTION_CACHE_DB'] = os.environ.get('DETECTION_CACHE_DB', '')
+app.config['DETECTION_CACHE_DB_SIZE'] = int(os.environ.get('DETECTION_CACHE_DB_SIZE', 100000))
+app.config['DETECTION_CACHE_PHASH_DISTANCE'] = int(os.environ.get('DETECTION_CACHE_PHASH_DISTANCE', 0))
+
+# Bulk detection API
+app.config['BULK_MAX_CONTENT_LENGTH'] = int(os.environ.get('BULK_MAX_CONTENT_LENGTH', 256 * 1024 * 1024))
+app.config['BULK_MAX_IMAGES'] = int(os.environ.get('BULK_MAX_IMAGES', 500))
+# Total decompressed image bytes read per bulk request
+app.config['BULK_MAX_UNCOMPRESSED_BYTES'] = int(os.environ.get('BULK_MAX_UNCOMPRESSED_BYTES', 512 * 1024 * 1024))
+app.config['BULK_BATCH_SIZE'] = int(os.environ.get('BULK_BATCH_SIZE', 32))
+app.config['PREPROCESS_WORKERS'] = int(os.environ.get('PREPROCESS_WORKERS', 4))
+
+# Chat answer cache for near-duplicate questions
+app.config['CHAT_CACHE_SIZE'] = int(os.environ.get('CHAT_CACHE_SIZE', 2000))
+app.config['CHAT_CACHE_TTL'] = int(os.environ.get('CHAT_CACHE_TTL', 7 * 24 * 3600))
+app.config['CHAT_CACHE_THRESHOLD'] = float(os.environ.get('CHAT_CACHE_THRESHOLD', 0.9))
+
+# Conversation context sent with each chat message
+app.config['CHAT_CONTEXT_TOKENS'] = int(os.environ.get('CHAT_CONTEXT_TOKENS', 1500))
+app.config['CHAT_CONTEXT_TURNS'] = int(os.environ.get('CHAT_CONTEXT_TURNS', 10))
+app.config['CHAT_SUMMARY_KEEP_TURNS'] = int(os.environ.get('CHAT_SUMMARY_KEEP_TURNS', 6))
+app.config['CHAT_SUMMARY_BATCH_TURNS'] = int(os.environ.get('CHAT_SUMMARY_BATCH_TURNS', 4))
+app.config['CHAT_SUMMARY_TOKENS'] = int(os.environ.get('CHAT_SUMMARY_TOKENS', 300))
+
+# Background detection jobs
+app.config['DETECTION_JOB_WORKERS'] = int(os.environ.get('DETECTION_JOB_WORKERS', 2))
+
+# Gemini Vision review of low-confidence detections
+app.config['DETECTION_REVIEW_THRESHOLD'] = float(os.environ.get('DETECTION_REVIEW_THRESHOLD', 0.6))
+app.config['DETECTION_REVIEW_MAX_RATE'] = float(os.environ.get('DETECTION_REVIEW_MAX_RATE', 0.25))
+app.config['DETECTION_REVIEW_WORKERS'] = int(os.environ.get('DETECTION_REVIEW_WORKERS', 2))
+
+# History pagination (chat page shows the newest turns in full, older ones load on scroll)
+app.config['CHAT_PAGE_SIZE'] = int(os.environ.get('CHAT_PAGE_SIZE', 10))
+app.config['HISTORY_PAGE_SIZE'] = int(os.environ.get('HISTORY_PAGE_SIZE', 20))
+app.config['HISTORY_MAX_PAGE_SIZE'] = int(os.environ.get('HISTORY_MAX_PAGE_SIZE', 100))
+app.config['HISTORY_PREVIEW_CHARS'] = int(os.environ.get('HISTORY_PREVIEW_CHARS', 160))
+
+# Seconds between checks of crop_care_data.json for changes
+app.config['CROP_CARE_RELOAD_INTERVAL'] = float(os.environ.get('CROP_CARE_RELOAD_INTERVAL', 2.0))
+
+# Per-user dashboard data is cached briefly and dropped on new activity
+app.config['DASHBOARD_CACHE_TTL'] = int(os.environ.get('DASHBOARD_CACHE_TTL', 30))
+
+# Page-view audit rows are written behind the request in batches
+app.config['ACTIVITY_LOG_BATCH_SIZE'] = int(os.environ.get('ACTIVITY_LOG_BATCH_SIZE', 200))
+app.config['ACTIVITY_LOG_FLUSH_INTERVAL'] = float(os.environ.get('ACTIVITY_LOG_FLUSH_INTERVAL', 2.0))
+app.config['ACTIVITY_LOG_MAX_QUEUE'] = int(os.environ.get('ACTIVITY_LOG_MAX_QUEUE', 10000))
+app.config['ACTIVITY_LOG_RETRIES'] = int(os.environ.get('ACTIVITY_LOG_RETRIES', 3))
+
+# Rendered home and crop care pages, and how long fingerprinted static files are cached
+app.config['PAGE_CACHE_SIZE'] = int(os.environ.get('PAGE_CACHE_SIZE', 256))
+app.config['STATIC_MAX_AGE'] = int(os.environ.get('STATIC_MAX_AGE', 365 * 24 * 3600))
+
 # Initialize extensions
 db.init_app(app)
+dashboard_cache = DashboardCache(ttl=app.config['DASHBOARD_CACHE_TTL'])
+track_activity(db.session, dashboard_cache)
+page_cache = RenderedPageCache(max_entries=app.config['PAGE_CACHE_SIZE'])
+static_fingerprints = StaticFingerprints(app.static_folder)
+templates_modified = latest_mtime(os.path.join(app.root_path, app.template_folder))
 login_manager = LoginManager()
 login_manager.init_app(app)
 login_manager.login_view = 'login'
@@ -39,33 +129,111 @@ def load_user(user_id):
 
 # Load ML model and crop care data
 disease_model = None
-crop_care_data = {}
+inference_batcher = None
+detection_cache = None
+preprocess_pool = None
+detection_jobs = None
+detection_escalator = None
+chat_cache = None
+conversation_summarizer = None
+activity_log = None
+crop_knowledge = None
 
 def init_app():
     """Initialize the application"""
-    global disease_model, crop_care_data
+    global disease_model, inference_batcher, detection_cache, preprocess_pool, detection_jobs, detection_escalator, chat_cache, conversation_summarizer, activity_log, crop_knowledge
     
     with app.app_context():
-        # Create database tables
+        # Create database tables and bring existing ones up to date
         db.create_all()
+        migrate(db.engine)
         
         # Create demo users
         create_demo_users()
         
+        # Queue page-view logging off the request path; write what is left at exit
+        activity_log = ActivityLogger(
+            app,
+            max_batch=app.config['ACTIVITY_LOG_BATCH_SIZE'],
+            flush_interval=app.config['ACTIVITY_LOG_FLUSH_INTERVAL'],
+            max_queue=app.config['ACTIVITY_LOG_MAX_QUEUE'],
+            max_retries=app.config['ACTIVITY_LOG_RETRIES']
+        )
+        atexit.register(activity_log.close)
+        
         # Load ML model
         disease_model = load_model()
+        if disease_model is not None:
+            inference_batcher = InferenceBatcher(
+                disease_model,
+                max_batch_size=app.config['INFERENCE_MAX_BATCH_SIZE'],
+                max_wait_ms=app.config['INFERENCE_MAX_WAIT_MS'],
+                max_queue_depth=app.config['INFERENCE_QUEUE_DEPTH']
+            )
+            detection_cache = DetectionCache(
+                disease_model.version,
+                max_entries=app.config['DETECTION_CACHE_SIZE'],
+                db_path=app.config['DETECTION_CACHE_DB'] or None,
+                phash_distance=app.config['DETECTION_CACHE_PHASH_DISTANCE'],
+                max_db_entries=app.config['DETECTION_CACHE_DB_SIZE']
+            )
+            preprocess_pool = ThreadPoolExecutor(
+                max_workers=app.config['PREPROCESS_WORKERS'],
+                thread_name_prefix='preprocess'
+            )
         
-        # Load crop care data
-        try:
-            with open('crop_care_data.json', 'r') as f:
-                crop_care_data = json.load(f)
-        except FileNotFoundError:
-            logging.warning("crop_care_data.json not found")
-            crop_care_data = {}
+        # Escalate uncertain local predictions to Gemini Vision in the background
+        detection_escalator = DetectionEscalator(
+            app,
+            review_detection_image,
+            threshold=app.config['DETECTION_REVIEW_THRESHOLD'],
+            max_rate=app.config['DETECTION_REVIEW_MAX_RATE'],
+            max_workers=app.config['DETECTION_REVIEW_WORKERS']
+        )
+        detection_escalator.resume()
+        
+        # Start background detection workers and pick up unfinished jobs
+        detection_jobs = DetectionJobQueue(
+            app, run_detection_job, max_workers=app.config['DETECTION_JOB_WORKERS'],
+            on_detection=detection_escalator.consider
+        )
+        detection_jobs.resume()
+        
+        # Warm the chat answer cache from recent conversations
+        chat_cache = ChatResponseCache(
+            max_entries=app.config['CHAT_CACHE_SIZE'],
+            ttl=app.config['CHAT_CACHE_TTL'],
+            threshold=app.config['CHAT_CACHE_THRESHOLD'],
+            topic_terms=topic_vocabulary(DISEASE_CLASSES)
+        )
+        seed_chat_cache()
+        
+        # Fold older chat turns into per-user summaries in the background
+        conversation_summarizer = ConversationSummarizer(
+            app,
+            partial(summarize_conversation, max_tokens=app.config['CHAT_SUMMARY_TOKENS']),
+            keep_turns=app.config['CHAT_SUMMARY_KEEP_TURNS'],
+            batch_turns=app.config['CHAT_SUMMARY_BATCH_TURNS']
+        )
+        
+        # Compile the crop care guides; edits to the JSON are picked up while running
+        crop_knowledge = CropKnowledgeStore(CROP_CARE_PATH, check_interval=app.config['CROP_CARE_RELOAD_INTERVAL'])
+        crop_knowledge.on_reload.append(reload_advice_rules)
+        crop_knowledge.on_reload.append(page_cache.clear)
         
         # Create upload directory
         os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
 
+def seed_chat_cache():
+    """Load recent ChatHistory answers given without conversation context into the chat cache"""
+    rows = ChatHistory.query.filter(ChatHistory.cacheable.is_(True))\
+        .order_by(ChatHistory.created_at.desc())\
+        .limit(app.config['CHAT_CACHE_SIZE']).all()
+    for chat in reversed(rows):
+        if chat.ai_response not in FALLBACK_RESPONSES:
+            stored_at = chat.created_at.replace(tzinfo=timezone.utc).timestamp()
+            chat_cache.put(chat.user_message, chat.ai_response, stored_at=stored_at)
+
 def create_demo_users():
     """Create demo users for testing"""
     demo_users = [
@@ -85,10 +253,56 @@ def create_demo_users():
     
     db.session.commit()
 
+@app.url_defaults
+def fingerprint_static_urls(endpoint, values):
+    """Version static URLs by content so browsers can keep them for a year"""
+    if endpoint == 'static' and 'v' not in values:
+        fingerprint = static_fingerprints.get(values.get('filename', ''))
+        if fingerprint:
+            values['v'] = fingerprint
+
+@app.after_request
+def cache_static_files(response):
+    """Far-future caching for static files requested by their current fingerprint"""
+    if request.endpoint == 'static' and response.status_code in (200, 304):
+        fingerprint = request.args.get('v')
+        if fingerprint and fingerprint == static_fingerprints.get(request.view_args.get('filename', '')):
+            response.cache_control.no_cache = None
+            response.cache_control.public = True
+            response.cache_control.max_age = app.config['STATIC_MAX_AGE']
+            response.cache_control.immutable = True
+            response.expires = int(time.time() + app.config['STATIC_MAX_AGE'])
+    return response
+
+def render_cached(template, version=None, modified_at=None, **context):
+    """Render a page that only changes with its data, answering revalidations with 304.
+
+    Pages are cached per template, crop, data version and viewer (the navbar
+    shows who is logged in), and by the static fingerprint generation, since
+    the body embeds ``?v=`` asset URLs. Responses carry an ETag and Last-Modified and
+    must be revalidated, so an unchanged page costs a 304 with no body.
+    """
+    if session.get('_flashes'):
+        # Flashed messages are shown once; render them fresh and uncached
+        return render_template(template, **context)
+    
+    key = (template, context.get('crop_name'), version, current_user.get_id(), static_fingerprints.generation())
+    last_modified = max(filter(None, (templates_modified, modified_at, static_fingerprints.modified_at)))
+    page = page_cache.get_or_render(key, lambda: render_template(template, **context), last_modified)
+    
+    response = app.response_class(page.body, mimetype='text/html')
+    response.set_etag(page.etag)
+    response.last_modified = page.last_modified
+    response.cache_control.no_cache = True
+    if current_user.is_authenticated:
+        response.cache_control.private = True
+    response.vary.add('Cookie')
+    return response.make_conditional(request)
+
 # Routes
 @app.route('/')
 def index():
-    return render_template('index.html')
+    return render_cached('index.html')
 
 @app.route('/login', methods=['GET', 'POST'])
 def login():
@@ -146,24 +360,42 @@ def logout():
 @app.route('/dashboard')
 @login_required
 def dashboard():
-    # Get user statistics
-    detection_count = Detection.query.filter_by(user_id=current_user.id).count()
-    weather_count = WeatherQuery.query.filter_by(user_id=current_user.id).count()
-    chat_count = ChatHistory.query.filter_by(user_id=current_user.id).count()
-    crop_care_count = CropCareQuery.query.filter_by(user_id=current_user.id).count()
+    data = dashboard_cache.get(current_user.id)
+    if data is None:
+        data = load_dashboard(current_user.id)
+        dashboard_cache.set(current_user.id, data)
+    
+    return render_template('dashboard.html', **data)
+
+@app.route('/api/dashboard/metrics')
+@login_required
+def dashboard_metrics():
+    metrics = dashboard_cache.get_metrics()
+    metrics['activity_log'] = activity_log.get_metrics()
+    metrics['page_cache'] = page_cache.get_metrics()
+    return jsonify(metrics)
+
+def load_dashboard(user_id):
+    """Read everything the dashboard shows for a user"""
+    # Activity counters are maintained on insert, so this is a single-row read
+    stats = load_user_stats(user_id)
     
     # Get recent detections
-    recent_detections = Detection.query.filter_by(user_id=current_user.id)\
-        .order_by(Detection.detected_at.desc()).limit(5).all()
+    rows, next_cursor = keyset_page(
+        db.session.query(Detection.id, Detection.disease_name, Detection.confidence, Detection.detected_at)
+        .filter(Detection.user_id == user_id),
+        Detection.detected_at, Detection.id, limit=5
+    )
+    recent_detections = [dict(row._mapping) for row in rows]
     
-    stats = {
-        'detections': detection_count,
-        'weather_queries': weather_count,
-        'chat_messages': chat_count,
-        'crop_care_queries': crop_care_count
-    }
+    # Background analyses still in progress
+    active_jobs = DetectionJob.query.filter(
+        DetectionJob.user_id == user_id,
+        DetectionJob.status.in_(ACTIVE_STATUSES)
+    ).count()
     
-    return render_template('dashboard.html', stats=stats, recent_detections=recent_detections)
+    return {'stats': stats, 'recent_detections': recent_detections, 'detections_cursor': next_cursor,
+            'active_jobs': active_jobs}
 
 @app.route('/detect', methods=['GET', 'POST'])
 @login_required
@@ -179,21 +411,19 @@ def detect():
             return render_template('detect.html')
         
         if file and allowed_file(file.filename):
-            filename = secure_filename(file.filename or "")
-            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S_')
-            filename = timestamp + filename
-            filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-            file.save(filepath)
+            data = file.read()
+            digest = content_hash(data)
+            filename = save_upload(data, digest, file.filename)
+            
+            if request.form.get('background'):
+                detection_jobs.submit(current_user.id, filename)
+                flash('Your image is being analyzed. Results will appear on your dashboard.', 'info')
+                return redirect(url_for('dashboard'))
             
             try:
-                # Process image
-                image = Image.open(filepath)
-                processed_image = preprocess_image(image)
+                prediction = predict_upload(data, digest)
                 
-                if processed_image is not None and disease_model is not None:
-                    # Make prediction
-                    prediction = predict_disease(disease_model, processed_image)
-                    
+                if prediction is not None:
                     # Save detection to database
                     detection = Detection()
                     detection.user_id = current_user.id
@@ -204,79 +434,576 @@ def detect():
                     db.session.add(detection)
                     db.session.commit()
                     
-                    return render_template('detect.html', prediction=prediction, image_path=filename)
+                    # The local model was unsure; ask Gemini Vision for a second opinion
+                    review_pending = detection_escalator.consider(detection)
+                    
+                    crop_guide = crop_knowledge.current().crop_by_disease.get(prediction['disease'])
+                    return render_template('detect.html', prediction=prediction, image_path=filename, crop_guide=crop_guide,
+                                           detection_id=detection.id, review_pending=review_pending)
                 else:
                     flash('Error processing image', 'error')
+            except queue.Full:
+                logging.warning("Inference queue full, rejecting detection request")
+                flash('The detection service is busy. Please try again in a moment.', 'error')
             except Exception as e:
                 logging.error(f"Error during prediction: {e}")
                 flash('Error analyzing image. Please try again.', 'error')
     
     return render_template('detect.html')
 
+@app.route('/api/detect/bulk', methods=['POST'])
+@login_required
+def detect_bulk():
+    """Detect diseases for many images, streaming one NDJSON line per image"""
+    if disease_model is None:
+        return jsonify({'error': 'Model not loaded'}), 503
+    
+    request.max_content_length = app.config['BULK_MAX_CONTENT_LENGTH']
+    resources = ExitStack()
+    try:
+        uploads = collect_bulk_uploads(resources)
+    except (zipfile.BadZipFile, ValueError) as e:
+        resources.close()
+        return jsonify({'error': str(e)}), 400
+    
+    if not uploads:
+        resources.close()
+        return jsonify({'error': 'No images found'}), 400
+    
+    generator = stream_bulk_detections(uploads, current_user.id, resources)
+    return Response(stream_with_context(generator), mimetype='application/x-ndjson')
+
+@app.route('/api/detect/jobs', methods=['GET', 'POST'])
+@login_required
+def detection_job_list():
+    """Submit a background detection job, or list the user's recent jobs"""
+    if request.method == 'POST':
+        file = request.files.get('file')
+        if not file or not file.filename or not allowed_file(file.filename):
+            return jsonify({'error': 'A PNG, JPG, JPEG or GIF file is required'}), 400
+        
+        data = file.read()
+        filename = save_upload(data, content_hash(data), file.filename)
+        job = detection_jobs.submit(current_user.id, filename)
+        return jsonify({
+            'id': job.id,
+            'status': job.status,
+            'status_url': url_for('detection_job_status', job_id=job.id)
+        }), 202
+    
+    jobs = DetectionJob.query.filter_by(user_id=current_user.id)
+    if request.args.get('active'):
+        jobs = jobs.filter(DetectionJob.status.in_(ACTIVE_STATUSES))
+    jobs = jobs.order_by(DetectionJob.created_at.desc()).limit(20).all()
+    return jsonify({'jobs': [serialize_job(job) for job in jobs]})
+
+@app.route('/api/detect/jobs/<job_id>')
+@login_required
+def detection_job_status(job_id):
+    job = DetectionJob.query.filter_by(id=job_id, user_id=current_user.id).first()
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(serialize_job(job))
+
+@app.route('/api/detect/history')
+@login_required
+def detection_history_page():
+    """Page back through the user's detections, newest first, without treatment text"""
+    query = db.session.query(
+        Detection.id, Detection.disease_name, Detection.confidence, Detection.image_path,
+        Detection.detected_at
+    ).filter(Detection.user_id == current_user.id)
+    try:
+        rows, next_cursor = history_page(query, Detection.detected_at, Detection.id)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    items = [{
+        'id': row.id,
+        'disease_name': row.disease_name,
+        'confidence': row.confidence,
+        'image_path': row.image_path,
+        'detected_at': row.detected_at.isoformat(),
+        'url': url_for('detection_history_item', detection_id=row.id)
+    } for row in rows]
+    return jsonify({'items': items, 'next_cursor': next_cursor})
+
+@app.route('/api/detect/history/<int:detection_id>')
+@login_required
+def detection_history_item(detection_id):
+    detection = Detection.query.filter_by(id=detection_id, user_id=current_user.id).first()
+    if detection is None:
+        return jsonify({'error': 'Detection not found'}), 404
+    return jsonify({
+        'id': detection.id,
+        'disease_name': detection.disease_name,
+        'confidence': detection.confidence,
+        'treatment': detection.treatment,
+        'image_path': detection.image_path,
+        'detected_at': detection.detected_at.isoformat(),
+        'review': serialize_review(db.session.get(DetectionReview, detection_id))
+    })
+
+@app.route('/api/detect/<int:detection_id>/review')
+@login_required
+def detection_review(detection_id):
+    """Status of the Gemini Vision review of a low-confidence detection"""
+    detection = Detection.query.filter_by(id=detection_id, user_id=current_user.id).first()
+    if detection is None:
+        return jsonify({'error': 'Detection not found'}), 404
+    return jsonify(serialize_review(db.session.get(DetectionReview, detection_id)))
+
 @app.route('/crop-care')
 @login_required
 def crop_care():
-    return render_template('crop_care.html', crops=crop_care_data)
+    knowledge = crop_knowledge.current()
+    return render_cached('crop_care.html', knowledge.version, knowledge.modified_at, crops=knowledge.summaries)
 
 @app.route('/crop-care/<crop_name>')
 @login_required
 def crop_detail(crop_name):
-    if crop_name in crop_care_data:
+    knowledge = crop_knowledge.current()
+    crop_name = knowledge.canonical(crop_name)
+    if crop_name:
         # Log query
-        query = CropCareQuery()
-        query.user_id = current_user.id
-        query.crop_type = crop_name
-        db.session.add(query)
-        db.session.commit()
+        activity_log.log(CropCareQuery, user_id=current_user.id, crop_type=crop_name)
         
-        crop_info = crop_care_data[crop_name]
-        return render_template('crop_care.html', crop_name=crop_name, crop_info=crop_info, crops=crop_care_data)
+        crop_info = knowledge.crops[crop_name]
+        return render_cached('crop_care.html', knowledge.version, knowledge.modified_at,
+                             crop_name=crop_name, crop_info=crop_info, crops=knowledge.summaries)
     else:
         flash('Crop information not found', 'error')
         return redirect(url_for('crop_care'))
 
+@app.route('/api/crop-care/search')
+@login_required
+def crop_care_search():
+    """Full-text search over crop care tips, problems and disease treatments"""
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({'error': 'Query is required'}), 400
+    limit = min(request.args.get('limit', 10, type=int), 50)
+    
+    started = time.perf_counter()
+    results = crop_knowledge.current().search(query, max(limit, 1))
+    elapsed_us = (time.perf_counter() - started) * 1e6
+    
+    for result in results:
+        result['url'] = url_for('crop_detail', crop_name=result['crop'])
+    return jsonify({'query': query, 'results': results, 'elapsed_us': round(elapsed_us, 1)})
+
+@app.route('/api/crop-care/<crop_name>')
+@login_required
+def crop_care_api(crop_name):
+    """Care guide for a crop with the disease classes the detector knows for it"""
+    knowledge = crop_knowledge.current()
+    crop_name = knowledge.canonical(crop_name)
+    if crop_name is None:
+        return jsonify({'error': 'Crop not found'}), 404
+    return jsonify({
+        'crop': crop_name,
+        'guide': knowledge.crops[crop_name],
+        'diseases': knowledge.diseases_by_crop[crop_name]
+    })
+
 @app.route('/weather', methods=['GET', 'POST'])
 @login_required
 def weather():
     weather_data = None
     if request.method == 'POST':
         location = request.form.get('location')
+        crop = crop_knowledge.current().canonical(request.form.get('crop'))
         if location:
-            weather_data = get_weather_data(location)
+            weather_data = get_weather_data(location, crop)
             if weather_data:
                 # Log query
-                query = WeatherQuery()
-                query.user_id = current_user.id
-                query.location = location
-                db.session.add(query)
-                db.session.commit()
+                activity_log.log(WeatherQuery, user_id=current_user.id, location=location)
             else:
                 flash('Weather data not available for this location', 'error')
     
-    return render_template('weather.html', weather_data=weather_data)
+    return render_template('weather.html', weather_data=weather_data, crops=crop_knowledge.current().names)
+
+@app.route('/api/weather/metrics')
+@login_required
+def weather_metrics():
+    return jsonify(get_cache_stats())
 
 @app.route('/chat', methods=['GET', 'POST'])
 @login_required
 def chat():
-    chat_history = ChatHistory.query.filter_by(user_id=current_user.id)\
-        .order_by(ChatHistory.created_at.desc()).limit(20).all()
-    
     if request.method == 'POST':
         user_message = request.form.get('message')
         if user_message:
-            ai_response = get_ai_response(user_message)
+            context = chat_context(current_user.id)
+            # Questions that stand on their own share answers through the cache;
+            # others only fall back to it when Gemini is unavailable
+            ai_response = chat_cache.get(user_message) if uses_chat_cache(user_message, context) else None
+            cacheable = ai_response is not None
+            if ai_response is None:
+                started = time.perf_counter()
+                ai_response = get_ai_response(user_message, context)
+                cacheable = shareable_answer(user_message, ai_response, context)
+                if cacheable:
+                    chat_cache.put(user_message, ai_response, time.perf_counter() - started)
             
             # Save to database
             chat = ChatHistory()
             chat.user_id = current_user.id
             chat.user_message = user_message
             chat.ai_response = ai_response
+            chat.cacheable = cacheable
             db.session.add(chat)
             db.session.commit()
+            conversation_summarizer.maybe_schedule(current_user.id)
             
             return redirect(url_for('chat'))
     
-    return render_template('chat.html', chat_history=reversed(chat_history))
+    # Newest turns in full; older ones are fetched as summaries on scroll
+    chat_history, next_cursor = keyset_page(
+        ChatHistory.query.filter_by(user_id=current_user.id),
+        ChatHistory.created_at, ChatHistory.id, limit=app.config['CHAT_PAGE_SIZE']
+    )
+    return render_template('chat.html', chat_history=reversed(chat_history), next_cursor=next_cursor)
+
+@app.route('/api/chat/history')
+@login_required
+def chat_history_page():
+    """Page back through the user's chat, newest first, as lightweight summaries"""
+    preview_chars = app.config['HISTORY_PREVIEW_CHARS']
+    # Only a prefix of each stored reply is read; full bodies are fetched per turn
+    query = db.session.query(
+        ChatHistory.id, ChatHistory.user_message, ChatHistory.created_at,
+        db.func.substr(ChatHistory.ai_response, 1, preview_chars * 4).label('response_head')
+    ).filter(ChatHistory.user_id == current_user.id)
+    try:
+        rows, next_cursor = history_page(query, ChatHistory.created_at, ChatHistory.id)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    items = []
+    for row in rows:
+        preview = html_to_text(row.response_head)
+        items.append({
+            'id': row.id,
+            'user_message': row.user_message,
+            'preview': preview[:preview_chars].rstrip() + '…' if len(preview) > preview_chars else preview,
+            'created_at': row.created_at.isoformat(),
+            'url': url_for('chat_history_item', chat_id=row.id)
+        })
+    return jsonify({'items': items, 'next_cursor': next_cursor})
+
+@app.route('/api/chat/history/<int:chat_id>')
+@login_required
+def chat_history_item(chat_id):
+    chat = ChatHistory.query.filter_by(id=chat_id, user_id=current_user.id).first()
+    if chat is None:
+        return jsonify({'error': 'Message not found'}), 404
+    return jsonify({
+        'id': chat.id,
+        'user_message': chat.user_message,
+        'ai_response': chat.ai_response,
+        'created_at': chat.created_at.isoformat()
+    })
+
+@app.route('/api/inference/metrics')
+@login_required
+def inference_metrics():
+    if inference_batcher is None:
+        return jsonify({'error': 'Model not loaded'}), 503
+    metrics = inference_batcher.get_metrics()
+    metrics['result_cache'] = detection_cache.get_metrics()
+    metrics['escalation'] = detection_escalator.get_metrics()
+    return jsonify(metrics)
+
+def save_upload(data, digest, original_filename):
+    """Store an upload under its content hash so repeat uploads share one file"""
+    extension = secure_filename(original_filename or "").rsplit('.', 1)[-1].lower()
+    filename = f"{digest}.{extension}"
+    filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
+    if not os.path.exists(filepath):
+        with open(filepath, 'wb') as f:
+            f.write(data)
+    return filename
+
+def detach_upload_stream(file, resources):
+    """Take over an uploaded file's stream so it outlives the request context.
+
+    Flask closes request files when the view returns, before a streamed
+    response is generated; the stream is registered on ``resources`` instead.
+    """
+    stream = file.stream
+    file.stream = io.BytesIO()
+    resources.callback(stream.close)
+    return stream
+
+def read_limited(stream, limit):
+    """Read at most ``limit`` bytes from a file-like object"""
+    return stream.read(limit)
+
+def read_zip_entry(zf, info, limit):
+    """Decompress at most ``limit`` bytes of a zip entry"""
+    with zf.open(info) as entry:
+        return entry.read(limit)
+
+def collect_bulk_uploads(resources):
+    """List the images in multipart 'files' fields and 'archive' zips without reading them.
+
+    Returns (filename, read) pairs where ``read(limit)`` returns at most
+    ``limit`` bytes of the image. Open archives are registered on
+    ``resources`` and must stay open until every image has been read.
+    """
+    max_images = app.config['BULK_MAX_IMAGES']
+    uploads = []
+    
+    for file in request.files.getlist('files'):
+        if file.filename and allowed_file(file.filename):
+            uploads.append((file.filename, partial(read_limited, detach_upload_stream(file, resources))))
+    
+    archive = request.files.get('archive')
+    if archive and archive.filename:
+        zf = resources.enter_context(zipfile.ZipFile(detach_upload_stream(archive, resources)))
+        for info in zf.infolist():
+            if info.is_dir() or not allowed_file(info.filename):
+                continue
+            # Declared sizes can lie; reads are capped again in stream_bulk_detections
+            if info.file_size > app.config['MAX_CONTENT_LENGTH']:
+                raise ValueError(f"{info.filename} exceeds the per-image size limit")
+            uploads.append((os.path.basename(info.filename), partial(read_zip_entry, zf, info)))
+            if len(uploads) > max_images:
+                break
+    
+    if len(uploads) > max_images:
+        raise ValueError(f"At most {max_images} images can be submitted at once")
+    return uploads
+
+def prepare_bulk_image(upload, out):
+    """Save one bulk upload and either resolve it from cache or preprocess it into ``out``"""
+    filename, data = upload
+    item = {'filename': filename, 'prediction': None, 'phash': None}
+    if len(data) > app.config['MAX_CONTENT_LENGTH']:
+        item['error'] = 'Image exceeds the per-image size limit'
+        return item
+    try:
+        item['digest'] = content_hash(data)
+        item['image_path'] = save_upload(data, item['digest'], filename)
+        
+        item['prediction'] = detection_cache.get(item['digest'])
+        if item['prediction'] is None:
+            if preprocess_image(Image.open(io.BytesIO(data)), out=out) is None:
+                item['error'] = 'Error processing image'
+                return item
+            item['phash'] = perceptual_hash(out, disease_model.data_format)
+            item['prediction'] = detection_cache.get_similar(item['phash'])
+    except Exception as e:
+        logging.error(f"Error preparing bulk image {filename}: {e}")
+        item['error'] = 'Error processing image'
+    return item
+
+def read_bulk_chunk(uploads, budget):
+    """Read a batch of uploads, stopping once ``budget`` bytes would be exceeded.
+
+    Returns the (filename, bytes) pairs read and the bytes left in the
+    budget, or -1 when an image did not fit. Each read is capped just past
+    the per-image limit, so oversized images are detected without
+    decompressing them fully.
+    """
+    chunk = []
+    for filename, read in uploads:
+        data = read(min(app.config['MAX_CONTENT_LENGTH'], budget) + 1)
+        if len(data) > budget:
+            return chunk, -1
+        budget -= len(data)
+        chunk.append((filename, data))
+    return chunk, budget
+
+def stream_bulk_detections(uploads, user_id, resources):
+    """Yield NDJSON result lines while reading, preprocessing and predicting in batches.
+
+    Images are read one batch at a time, and at most
+    BULK_MAX_UNCOMPRESSED_BYTES are read per request in total, counting the
+    bytes actually decompressed. Closes ``resources`` when done.
+    """
+    batch_size = app.config['BULK_BATCH_SIZE']
+    buffer = np.empty((batch_size, *input_shape(disease_model.data_format)), dtype=np.float32)
+    budget = app.config['BULK_MAX_UNCOMPRESSED_BYTES']
+    rows = []
+    failed = 0
+    
+    with resources:
+        for start in range(0, len(uploads), batch_size):
+            chunk, budget = read_bulk_chunk(uploads[start:start + batch_size], budget)
+            items = list(preprocess_pool.map(prepare_bulk_image, chunk, buffer[:len(chunk)]))
+            
+            pending = [i for i, item in enumerate(items) if item['prediction'] is None and 'error' not in item]
+            if pending:
+                try:
+                    probabilities = disease_model.predict(buffer[pending])
+                    for i, scores in zip(pending, probabilities):
+                        items[i]['prediction'] = build_prediction(scores)
+                        detection_cache.set(items[i]['digest'], items[i]['prediction'], items[i]['phash'])
+                except Exception as e:
+                    logging.error(f"Error during bulk prediction: {e}")
+                    for i in pending:
+                        items[i]['error'] = 'Error analyzing image'
+            
+            for offset, item in enumerate(items):
+                line = {'index': start + offset, 'filename': item['filename']}
+                if 'error' in item:
+                    failed += 1
+                    line['error'] = item['error']
+                else:
+                    prediction = item['prediction']
+                    line['image_path'] = item['image_path']
+                    line['prediction'] = prediction
+                    rows.append({
+                        'user_id': user_id,
+                        'disease_name': prediction['disease'],
+                        'confidence': prediction['confidence'],
+                        'treatment': prediction['treatment'],
+                        'image_path': item['image_path']
+                    })
+                yield json.dumps(line) + '\n'
+            
+            if budget < 0:
+                skipped = len(uploads) - start - len(chunk)
+                failed += skipped
+                yield json.dumps({
+                    'error': f"Images exceed {app.config['BULK_MAX_UNCOMPRESSED_BYTES']} bytes in total; "
+                             f"the last {skipped} were not processed"
+                }) + '\n'
+                break
+    
+    # Save all detections in one bulk insert
+    if rows:
+        record_bulk_activity(db.session, user_id, {'detections': len(rows)})
+        db.session.execute(db.insert(Detection), rows)
+        db.session.commit()
+    
+    yield json.dumps({'done': True, 'processed': len(rows), 'failed': failed}) + '\n'
+
+def run_detection_job(job):
+    """Run the prediction for a background job from its saved upload"""
+    with open(os.path.join(app.config['UPLOAD_FOLDER'], job.image_path), 'rb') as f:
+        data = f.read()
+    # Uploads are stored under their content hash
+    return predict_upload(data, job.image_path.rsplit('.', 1)[0])
+
+def review_detection_image(image_path):
+    """Gemini Vision analysis of an uploaded image as (HTML, diagnosis), or None on failure"""
+    analysis = analyze_plant_image_with_ai(image_path, DISEASE_CLASSES)
+    if analysis in IMAGE_FALLBACK_RESPONSES:
+        return None
+    prose, diagnosis = parse_diagnosis(analysis, DISEASE_CLASSES)
+    return format_ai_response(prose), diagnosis
+
+def predict_upload(data, digest):
+    """Predict disease for uploaded image bytes, consulting the result cache first"""
+    if inference_batcher is None:
+        return None
+    
+    prediction = detection_cache.get(digest)
+    if prediction is not None:
+        return prediction
+    
+    processed_image = preprocess_image(Image.open(io.BytesIO(data)))
+    if processed_image is None:
+        return None
+    
+    # Near-identical photos (re-encoded, resized) share a perceptual hash; only
+    # consulted when DETECTION_CACHE_PHASH_DISTANCE is set
+    phash = perceptual_hash(processed_image, disease_model.data_format)
+    prediction = detection_cache.get_similar(phash)
+    if prediction is None:
+        # Make prediction (batched with concurrent requests)
+        prediction = inference_batcher.predict(processed_image, timeout=app.config['INFERENCE_TIMEOUT'])
+        detection_cache.set(digest, prediction, phash)
+    return prediction
+
+@app.route('/chat/stream')
+@login_required
+def chat_stream():
+    """Stream an AI reply to the browser as Server-Sent Events"""
+    user_message = request.args.get('message', '').strip()
+    if not user_message:
+        return jsonify({'error': 'Message is required'}), 400
+    
+    user_id = current_user.id
+    context = chat_context(user_id)
+    
+    def generate():
+        fragments = []
+        cacheable = False
+        try:
+            cached = chat_cache.get(user_message) if uses_chat_cache(user_message, context) else None
+            if cached is not None:
+                cacheable = True
+                fragments.append(cached)
+                yield sse_event('chunk', {'html': cached})
+            else:
+                started = time.perf_counter()
+                for fragment in stream_ai_response(user_message, context):
+                    fragments.append(fragment)
+                    yield sse_event('chunk', {'html': fragment})
+                cacheable = shareable_answer(user_message, ''.join(fragments), context)
+                if cacheable:
+                    chat_cache.put(user_message, ''.join(fragments), time.perf_counter() - started)
+        finally:
+            # Save what was sent, even if the client disconnected mid-reply
+            if fragments:
+                chat = ChatHistory()
+                chat.user_id = user_id
+                chat.user_message = user_message
+                chat.ai_response = ''.join(fragments)
+                chat.cacheable = cacheable
+                db.session.add(chat)
+                db.session.commit()
+                conversation_summarizer.maybe_schedule(user_id)
+        
+        yield sse_event('done', {'id': chat.id, 'created_at': chat.created_at.strftime('%H:%M')})
+    
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+@app.route('/api/chat/metrics')
+@login_required
+def chat_metrics():
+    metrics = chat_cache.get_metrics()
+    metrics['gemini'] = gemini.get_metrics()
+    return jsonify(metrics)
+
+def uses_chat_cache(user_message, context):
+    """Whether to look a message up in the shared answer cache"""
+    return context.empty or is_standalone(user_message) or not gemini.available()
+
+def shareable_answer(user_message, ai_response, context):
+    """Whether a freshly generated answer may go into the shared cache.
+
+    Every user's summary and recent turns go to Gemini, so an answer is
+    only shared when the question stands on its own and the answer did not
+    draw on them.
+    """
+    if ai_response in FALLBACK_RESPONSES:
+        return False
+    if context.empty:
+        return True
+    return is_standalone(user_message) and not chat_cache.uses_context(user_message, ai_response, context.text())
+
+def chat_context(user_id):
+    """Recent turns and rolling summary for a user's next chat message"""
+    return build_context(user_id, app.config['CHAT_CONTEXT_TOKENS'], app.config['CHAT_CONTEXT_TURNS'])
+
+def history_page(query, time_column, id_column):
+    """Apply the request's cursor and limit to a history query"""
+    limit = min(request.args.get('limit', app.config['HISTORY_PAGE_SIZE'], type=int),
+                app.config['HISTORY_MAX_PAGE_SIZE'])
+    return keyset_page(query, time_column, id_column, request.args.get('cursor'), max(limit, 1))
+
+def sse_event(event, data):
+    """Encode one Server-Sent Event"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
 
 def allowed_file(filename):
     """Check if file extension is allowed"""
@@ -0,0 +1,154 @@
+"""Concurrent detect/chat/weather load against each database configuration.
+
+Each configuration runs in its own process, because the app reads its
+database settings when it is imported. Worker threads log in through the
+Flask test client and cycle through image detection, chat and weather POSTs.
+Gemini is replaced by the canned client and OpenWeatherMap by the local
+stub, so the database is what contends.
+
+The SQLite runs use a fresh temporary database each. They compare SQLite's
+stock rollback journal with the WAL settings database.py applies. A
+PostgreSQL run with the pooled engine is added when --postgres-url (or a
+postgresql:// DATABASE_URL) is given and the server is reachable; otherwise
+it is skipped. That database gets the app's tables and the benchmark's rows,
+so point it at a scratch database:
+
+    python benchmarks/concurrent_load.py --threads 4 16
+    python benchmarks/concurrent_load.py --postgres-url postgresql://localhost/plant_bench
+"""
+import argparse
+import io
+import logging
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+sys.path.insert(0, ROOT)
+
+SQLITE_CONFIGURATIONS = ['DELETE/FULL', 'WAL/NORMAL']
+OPERATIONS = ('detect', 'chat', 'weather')
+
+def sample_images(count, seed=0):
+    import numpy as np
+    from PIL import Image
+    rng = np.random.default_rng(seed)
+    images = []
+    for _ in range(count):
+        buffer = io.BytesIO()
+        Image.fromarray((rng.random((64, 64, 3)) * 255).astype('uint8')).save(buffer, 'PNG')
+        images.append(buffer.getvalue())
+    return images
+
+def run_load(threads, ops, folder, label):
+    """Run the load in this process; the environment is already configured"""
+    from weather_stub import start_stub_server, base_url
+    os.environ['OPENWEATHER_BASE_URL'] = base_url(start_stub_server())
+
+    # Importing the app initializes it with the settings above
+    import app as plant_app
+    import gemini_chat
+    logging.disable(logging.CRITICAL)
+    gemini_chat.transport.delay = 0
+    plant_app.app.config['UPLOAD_FOLDER'] = os.path.join(folder, 'uploads')
+    os.makedirs(plant_app.app.config['UPLOAD_FOLDER'], exist_ok=True)
+
+    images = sample_images(threads * ops)
+    latencies = {op: [] for op in OPERATIONS}
+    errors = []
+
+    def worker(k):
+        client = plant_app.app.test_client()
+        client.post('/login', data={'username': 'farmer1', 'password': 'password123'})
+        for i in range(ops):
+            op = OPERATIONS[i % len(OPERATIONS)]
+            started = time.perf_counter()
+            if op == 'detect':
+                response = client.post('/detect', data={'file': (io.BytesIO(images[k * ops + i]), 'leaf.png')},
+                                       content_type='multipart/form-data')
+            elif op == 'chat':
+                response = client.post('/chat', data={'message': f"thread {k} question {i} about maize"})
+            else:
+                response = client.post('/weather', data={'location': 'Pune'})
+            latencies[op].append((time.perf_counter() - started) * 1000)
+            if response.status_code >= 500:
+                errors.append(response.status_code)
+
+    started = time.perf_counter()
+    workers = [threading.Thread(target=worker, args=(k,)) for k in range(threads)]
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    wall = time.perf_counter() - started
+    plant_app.activity_log.flush()
+
+    requests = sum(len(values) for values in latencies.values())
+    summary = ', '.join(
+        f"{op} p50 {statistics.median(values):.0f} p95 {sorted(values)[int(len(values) * 0.95)]:.0f} ms"
+        for op, values in latencies.items()
+    )
+    print(f"{threads:3} threads  {label:18} {requests / wall:6.1f} req/s  errors {len(errors)}  {summary}")
+
+def postgres_available(url):
+    """Whether a PostgreSQL server answers at ``url``"""
+    from sqlalchemy import create_engine, text
+    try:
+        engine = create_engine(url)
+        with engine.connect() as connection:
+            connection.execute(text('SELECT 1'))
+        engine.dispose()
+        return True
+    except Exception as e:
+        print(f"Skipping PostgreSQL: {e.__class__.__name__}: {str(e).splitlines()[0]}")
+        return False
+
+def run_child(threads, ops, label, env):
+    with tempfile.TemporaryDirectory() as folder:
+        env = dict(os.environ, GEMINI_FAKE='1', DETECTION_REVIEW_MAX_RATE='0', **env)
+        env.setdefault('DATABASE_URL', 'sqlite:///' + os.path.join(folder, 'load.db'))
+        subprocess.run([sys.executable, os.path.abspath(__file__), '--child', '--label', label,
+                        '--folder', folder, '--threads', str(threads), '--ops', str(ops)],
+                       env=env, cwd=ROOT, check=True)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--threads', type=int, nargs='+', default=[4, 16])
+    parser.add_argument('--ops', type=int, default=30, help='requests per thread')
+    parser.add_argument('--config', choices=SQLITE_CONFIGURATIONS, nargs='*', default=SQLITE_CONFIGURATIONS,
+                        help='SQLite journal_mode/synchronous pairs to compare')
+    parser.add_argument('--postgres-url', help='scratch PostgreSQL database for the pooled-engine run')
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--label', help=argparse.SUPPRESS)
+    parser.add_argument('--folder', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_load(args.threads[0], args.ops, args.folder, args.label)
+        return
+
+    from database import database_url
+    postgres_url = args.postgres_url
+    if postgres_url is None and os.environ.get('DATABASE_URL'):
+        configured = database_url()
+        postgres_url = configured if configured.startswith('postgresql') else None
+    if postgres_url and not postgres_available(postgres_url):
+        postgres_url = None
+
+    for threads in args.threads:
+        for config in args.config:
+            journal_mode, synchronous = config.split('/')
+            env = {'SQLITE_JOURNAL_MODE': journal_mode, 'SQLITE_SYNCHRONOUS': synchronous}
+            # Without an explicit URL the child uses a temporary SQLite file
+            os.environ.pop('DATABASE_URL', None)
+            run_child(threads, args.ops, f"sqlite {journal_mode}", env)
+        if postgres_url:
+            run_child(threads, args.ops, f"postgresql pool={os.environ.get('DB_POOL_SIZE', 10)}",
+                      {'DATABASE_URL': postgres_url})
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,142 @@
+"""Compare ResponseFormatter with the regex formatter it replaced.
+
+Formats a generated ~2000-token reply (numbered and bulleted lists with
+continuation lines) in one call and streamed in small chunks, then a
+reply holding one very long list item, with both implementations:
+
+    python benchmarks/format_response.py --repeat 200
+"""
+import argparse
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+from gemini_chat import ResponseFormatter, format_ai_response
+
+WORDS = 'soil water leaf blight fungicide apply remove spacing mulch crop rotate plant'.split()
+
+def legacy_format_ai_response(text):
+    """format_ai_response as it was before ResponseFormatter, for comparison"""
+    if not text or not text.strip():
+        return "No response generated."
+
+    formatted = text.strip()
+    formatted = re.sub(r'\*\*(.*?)\*\*', r'<strong class="text-primary">\1</strong>', formatted)
+    formatted = re.sub(r'\*(.*?)\*', r'<em>\1</em>', formatted)
+
+    formatted_paragraphs = []
+    for paragraph in formatted.split('\n\n'):
+        if not paragraph.strip():
+            continue
+
+        if re.search(r'^\d+\.', paragraph.strip()):
+            list_items = []
+            for line in paragraph.split('\n'):
+                if line.strip():
+                    if re.match(r'^\d+\.', line.strip()):
+                        list_items.append(f'<div class="mb-2"><strong class="text-success">{line.strip()}</strong></div>')
+                    elif list_items:
+                        list_items[-1] = list_items[-1].replace('</div>', f' {line.strip()}</div>')
+                    else:
+                        list_items.append(f'<div class="mb-2">{line.strip()}</div>')
+            formatted_paragraphs.append('<div class="mb-3">' + ''.join(list_items) + '</div>')
+
+        elif re.search(r'^[*•-]', paragraph.strip()):
+            list_items = []
+            for line in paragraph.split('\n'):
+                if line.strip():
+                    if re.match(r'^[*•-]', line.strip()):
+                        clean_line = re.sub(r'^[*•-]\s*', '', line.strip())
+                        list_items.append(f'<div class="mb-2"><span class="text-success me-2">•</span>{clean_line}</div>')
+                    elif list_items:
+                        list_items[-1] = list_items[-1].replace('</div>', f' {line.strip()}</div>')
+                    else:
+                        list_items.append(f'<div class="mb-2">{line.strip()}</div>')
+            formatted_paragraphs.append('<div class="mb-3">' + ''.join(list_items) + '</div>')
+
+        else:
+            paragraph_content = '<br>'.join([line.strip() for line in paragraph.split('\n') if line.strip()])
+            if paragraph_content:
+                formatted_paragraphs.append(f'<div class="mb-3">{paragraph_content}</div>')
+
+    return ''.join(formatted_paragraphs) or f'<div class="mb-3">{formatted}</div>'
+
+def legacy_stream(chunks):
+    """The old streaming path: format each complete paragraph on its own"""
+    buffer = ''
+    for chunk in chunks:
+        buffer += chunk
+        while '\n\n' in buffer:
+            paragraph, buffer = buffer.split('\n\n', 1)
+            if paragraph.strip():
+                yield legacy_format_ai_response(paragraph)
+    if buffer.strip():
+        yield legacy_format_ai_response(buffer)
+
+def formatter_stream(chunks):
+    formatter = ResponseFormatter()
+    for chunk in chunks:
+        yield formatter.feed(chunk)
+    yield formatter.finish()
+
+def sample_reply(tokens, seed=0):
+    """Markdown-style reply of roughly ``tokens`` tokens (about 4 characters each)"""
+    rnd = random.Random(seed)
+    def sentence(n):
+        return ' '.join(rnd.choice(WORDS) for _ in range(n))
+    parts = []
+    while sum(map(len, parts)) < tokens * 4:
+        parts.append('\n'.join(f"{i}. **{sentence(2)}** {sentence(10)}\n{sentence(8)}" for i in range(1, 30)))
+        parts.append('\n'.join(f"- {sentence(10)}\n  {sentence(6)}" for _ in range(20)))
+        parts.append(sentence(60))
+    return '\n\n'.join(parts)
+
+def long_item_reply(lines, seed=0):
+    """One numbered item followed by ``lines`` continuation lines"""
+    rnd = random.Random(seed)
+    return '1. start\n' + '\n'.join(' '.join(rnd.choice(WORDS) for _ in range(5)) for _ in range(lines))
+
+def time_ms(fn, repeat):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - started) / repeat * 1000
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--tokens', type=int, default=2000, help='approximate reply length')
+    parser.add_argument('--chunk', type=int, default=13, help='characters per streamed chunk')
+    parser.add_argument('--long-lines', type=int, default=3000, help='continuation lines in the long item')
+    parser.add_argument('--repeat', type=int, default=200)
+    args = parser.parse_args()
+
+    reply = sample_reply(args.tokens)
+    chunks = [reply[i:i + args.chunk] for i in range(0, len(reply), args.chunk)]
+    long_item = long_item_reply(args.long_lines)
+
+    # The sample has nothing to escape, so both must give the same markup
+    assert legacy_format_ai_response(reply) == format_ai_response(reply)
+    assert ''.join(formatter_stream(chunks)) == format_ai_response(reply)
+    assert legacy_format_ai_response(long_item) == format_ai_response(long_item)
+
+    rows = [
+        (f"reply ({len(reply.split())} words)",
+         time_ms(lambda: legacy_format_ai_response(reply), args.repeat),
+         time_ms(lambda: format_ai_response(reply), args.repeat)),
+        (f"streamed in {args.chunk}-char chunks",
+         time_ms(lambda: list(legacy_stream(chunks)), args.repeat),
+         time_ms(lambda: list(formatter_stream(chunks)), args.repeat)),
+        (f"list item of {args.long_lines} lines",
+         time_ms(lambda: legacy_format_ai_response(long_item), max(1, args.repeat // 10)),
+         time_ms(lambda: format_ai_response(long_item), max(1, args.repeat // 10))),
+    ]
+    print(f"{'':34} {'legacy':>10} {'formatter':>10}")
+    for label, legacy, current in rows:
+        print(f"{label + ':':34} {legacy:8.3f} ms {current:8.3f} ms")
+
+if __name__ == '__main__':
+    main()
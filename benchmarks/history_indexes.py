@@ -0,0 +1,144 @@
+"""Show query plans and latencies of the history queries before and after the indexes.
+
+Builds a throwaway SQLite database from the models, drops the per-user
+indexes to get the schema older databases had, and seeds it with a large
+history. The queries are the ones the app issues: each is built the way the
+dashboard and history views build it and run through
+``pagination.keyset_page``, and the SQL it emits (including the row-value
+``(time, id) < (?, ?)`` seek of later pages) is captured and timed. It then
+applies the schema migrations and runs the same statements again:
+
+    python benchmarks/history_indexes.py --detections 2000000
+"""
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+from flask import Flask
+from sqlalchemy import event
+
+from migrations import migrate
+from models import db, ChatHistory, Detection
+from pagination import encode_cursor, keyset_page
+from plant_disease_model import DISEASE_CLASSES
+
+USER_ID = 42
+# Seek position for a page deep in the history
+DEEP_CURSOR = encode_cursor(datetime(2026, 6, 1), 10 ** 9)
+
+def detection_rows():
+    # As load_dashboard and detection_history_page select them
+    return db.session.query(
+        Detection.id, Detection.disease_name, Detection.confidence, Detection.image_path, Detection.detected_at
+    ).filter(Detection.user_id == USER_ID)
+
+def chat_preview_rows():
+    # As chat_history_page selects them
+    return db.session.query(
+        ChatHistory.id, ChatHistory.user_message, ChatHistory.created_at,
+        db.func.substr(ChatHistory.ai_response, 1, 640).label('response_head')
+    ).filter(ChatHistory.user_id == USER_ID)
+
+QUERIES = {
+    'dashboard detections': lambda: keyset_page(detection_rows(), Detection.detected_at, Detection.id, limit=5),
+    'detection history page': lambda: keyset_page(
+        detection_rows(), Detection.detected_at, Detection.id, DEEP_CURSOR),
+    'chat page': lambda: keyset_page(
+        ChatHistory.query.filter_by(user_id=USER_ID), ChatHistory.created_at, ChatHistory.id, limit=10),
+    'chat history page': lambda: keyset_page(
+        chat_preview_rows(), ChatHistory.created_at, ChatHistory.id, DEEP_CURSOR),
+}
+
+def emitted_sql(engine, build):
+    """Run ``build()`` and return the (SQL, parameters) of the statement it issued"""
+    statements = []
+    def record(connection, cursor, statement, parameters, context, executemany):
+        statements.append((statement, parameters))
+    event.listen(engine, 'before_cursor_execute', record)
+    try:
+        build()
+    finally:
+        event.remove(engine, 'before_cursor_execute', record)
+    return statements[-1]
+
+def random_timestamp(rnd):
+    return f"2026-{rnd.randint(1, 9):02d}-{rnd.randint(10, 28)} {rnd.randint(10, 23)}:{rnd.randint(10, 59)}:00"
+
+def seed(connection, users, detections, seed=0):
+    """Insert users plus detections and chats spread across them"""
+    rnd = random.Random(seed)
+    connection.executemany(
+        'INSERT INTO user (id, username, email, password_hash) VALUES (?, ?, ?, ?)',
+        ((i, f"user{i}", f"user{i}@example.com", 'x') for i in range(1, users + 1)))
+    connection.executemany(
+        'INSERT INTO detection (user_id, disease_name, confidence, detected_at) VALUES (?, ?, ?, ?)',
+        ((rnd.randint(1, users), rnd.choice(DISEASE_CLASSES), rnd.random(), random_timestamp(rnd))
+         for _ in range(detections)))
+    connection.executemany(
+        'INSERT INTO chat_history (user_id, user_message, ai_response, created_at) VALUES (?, ?, ?, ?)',
+        ((rnd.randint(1, users), 'question', 'answer', random_timestamp(rnd)) for _ in range(detections // 2)))
+    connection.commit()
+
+def run_queries(connection, statements, label, repeat):
+    for name, (sql, params) in statements.items():
+        plan = ' | '.join(row[3] for row in connection.execute('EXPLAIN QUERY PLAN ' + sql, params))
+        started = time.perf_counter()
+        for _ in range(repeat):
+            connection.execute(sql, params).fetchall()
+        elapsed = (time.perf_counter() - started) / repeat * 1000
+        print(f"{label:6} {name + ':':24} {elapsed:9.2f} ms  {plan}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=5000)
+    parser.add_argument('--detections', type=int, default=1000000,
+                        help='detection rows; half as many chats')
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--show-sql', action='store_true', help='print the captured statements')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as folder:
+        path = os.path.join(folder, 'history.db')
+        app = Flask(__name__)
+        app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + path
+        db.init_app(app)
+        with app.app_context():
+            db.create_all()
+            statements = {name: emitted_sql(db.engine, build) for name, build in QUERIES.items()}
+            db.engine.dispose()
+        if args.show_sql:
+            for name, (sql, params) in statements.items():
+                print(f"{name}: {' '.join(sql.split())} {params}")
+
+        connection = sqlite3.connect(path)
+        # The schema as it was before the composite indexes
+        for (name,) in connection.execute("SELECT name FROM sqlite_master WHERE type = 'index' AND name LIKE 'ix_%'").fetchall():
+            connection.execute(f'DROP INDEX {name}')
+
+        started = time.perf_counter()
+        seed(connection, args.users, args.detections)
+        print(f"seeded {args.detections} detections in {time.perf_counter() - started:.1f} s")
+        connection.execute('ANALYZE')
+        run_queries(connection, statements, 'before', args.repeat)
+        connection.close()
+
+        with app.app_context():
+            started = time.perf_counter()
+            migrate(db.engine)
+            print(f"migrations applied in {time.perf_counter() - started:.1f} s")
+            db.engine.dispose()
+
+        connection = sqlite3.connect(path)
+        connection.execute('ANALYZE')
+        run_queries(connection, statements, 'after', args.repeat)
+        connection.close()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,50 @@
+"""Measure get_weather_data against the local weather stub.
+
+Compares a cold lookup (current and forecast fetched concurrently) with the
+sequential time the two upstream calls would take, then a cached lookup.
+
+    python benchmarks/weather_fetch.py --delay 0.2
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+from weather_stub import start_stub_server, base_url
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--delay', type=float, default=0.2, help='stub latency per call (seconds)')
+    parser.add_argument('--locations', type=int, default=5)
+    args = parser.parse_args()
+
+    server = start_stub_server(delay=args.delay)
+    # Must be set before weather_service reads it at import
+    os.environ['OPENWEATHER_BASE_URL'] = base_url(server)
+    import weather_service
+
+    cold = []
+    for i in range(args.locations):
+        started = time.perf_counter()
+        data = weather_service.get_weather_data(f"Town{i}, IN")
+        cold.append(time.perf_counter() - started)
+        assert data is not None and len(data['forecast']) > 0
+
+    started = time.perf_counter()
+    weather_service.get_weather_data("town0,in")
+    cached = time.perf_counter() - started
+
+    rows = [
+        ('stub delay per call', f"{args.delay * 1000:.0f} ms"),
+        ('sequential lower bound', f"{2 * args.delay * 1000:.0f} ms"),
+        (f"cold lookup (avg of {args.locations})", f"{sum(cold) / len(cold) * 1000:.0f} ms"),
+        ('cached lookup', f"{cached * 1000:.2f} ms"),
+        ('upstream calls', server.hits),
+    ]
+    for label, value in rows:
+        print(f"{label + ':':28} {value}")
+
+if __name__ == '__main__':
+    main()
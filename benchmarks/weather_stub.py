@@ -0,0 +1,113 @@
+"""Local stand-in for the OpenWeatherMap API, for offline development and benchmarks.
+
+Serves canned ``/data/2.5/weather`` and ``/data/2.5/forecast`` payloads for
+any location, after an optional artificial delay. Point the app at it with
+OPENWEATHER_BASE_URL:
+
+    python benchmarks/weather_stub.py --port 8081 --delay 0.2
+    OPENWEATHER_BASE_URL=http://127.0.0.1:8081/data/2.5 python main.py
+
+Benchmarks import ``start_stub_server`` to run it on a background thread.
+"""
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+# UTC offset of the canned city, in seconds (IST)
+TIMEZONE = 19800
+
+def current_payload(location, now):
+    """Current conditions in the shape OpenWeatherMap returns"""
+    name = location.split(',')[0].strip().title() or 'Pune'
+    return {
+        'name': name,
+        'sys': {'country': 'IN', 'sunrise': now - 6 * 3600, 'sunset': now + 6 * 3600},
+        'main': {'temp': 24.3, 'feels_like': 25.1, 'humidity': 85, 'pressure': 1010},
+        'weather': [{'description': 'light rain', 'icon': '10d'}],
+        'wind': {'speed': 3.2, 'deg': 240},
+        'visibility': 8000,
+        'timezone': TIMEZONE,
+    }
+
+def forecast_payload(now):
+    """Forty 3-hourly slots starting at the next slot boundary"""
+    first = now - now % 10800 + 10800
+    slots = []
+    for i in range(40):
+        temp = 22 + 6 * ((i % 8) - 4) / 4
+        slot = {
+            'dt': first + i * 10800,
+            'main': {
+                'temp': temp,
+                'temp_min': temp - 1,
+                'temp_max': temp + 1,
+                'feels_like': temp,
+                'humidity': 70 + (i % 8) * 3,
+            },
+            'weather': [{'description': 'scattered clouds', 'icon': '03d'}],
+            'wind': {'speed': 2 + i % 5},
+        }
+        if i % 3 == 0:
+            slot['rain'] = {'3h': 0.6}
+        slots.append(slot)
+    return {'city': {'name': 'Pune', 'country': 'IN', 'timezone': TIMEZONE}, 'list': slots}
+
+class WeatherStubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        endpoint = url.path.rstrip('/').rsplit('/', 1)[-1]
+        location = parse_qs(url.query).get('q', [''])[0]
+        self.server.hits[endpoint] = self.server.hits.get(endpoint, 0) + 1
+        if self.server.delay:
+            time.sleep(self.server.delay)
+
+        now = int(time.time())
+        if endpoint == 'weather':
+            status, body = 200, current_payload(location, now)
+        elif endpoint == 'forecast':
+            status, body = 200, forecast_payload(now)
+        else:
+            status, body = 404, {'cod': '404', 'message': 'not found'}
+
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+def start_stub_server(host='127.0.0.1', port=0, delay=0.0, verbose=False):
+    """Serve the stub on a daemon thread; returns the server (``server_port``, ``hits``)"""
+    server = ThreadingHTTPServer((host, port), WeatherStubHandler)
+    server.delay = delay
+    server.verbose = verbose
+    server.hits = {}
+    threading.Thread(target=server.serve_forever, name='weather-stub', daemon=True).start()
+    return server
+
+def base_url(server):
+    """OPENWEATHER_BASE_URL for a running stub"""
+    return f"http://{server.server_address[0]}:{server.server_port}/data/2.5"
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8081)
+    parser.add_argument('--delay', type=float, default=0.0, help='seconds to wait before each response')
+    args = parser.parse_args()
+
+    server = start_stub_server(args.host, args.port, args.delay, verbose=True)
+    print(f"Weather stub listening; set OPENWEATHER_BASE_URL={base_url(server)}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
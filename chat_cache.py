@@ -0,0 +1,203 @@
+import re
+import threading
+import time
+import zlib
+
+import numpy as np
+
+# Words that carry no meaning for matching agricultural questions
+STOP_WORDS = frozenset("""
+a an and are as at be best by can could do does for from good have how i in is it
+its me my of on or should the their there this to what when where which why will
+with would you your please tell about any some get
+""".split())
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+# Crops farmers commonly ask about; a similar question must name the same ones
+CROP_TERMS = frozenset("""
+apple banana barley bean cabbage carrot cherry chilli chilly corn cotton cucumber grape
+groundnut maize mango millet onion orange pea peach pepper potato raspberry rice
+sorghum soybean squash strawberry sugarcane tomato wheat
+""".split())
+
+# Words by which a question points back into the conversation
+REFERRING_WORDS = frozenset("""
+it its this that these those they them same still again also else more other another
+earlier before previous mentioned above instead
+""".split())
+
+# Phrases by which a reply refers back to the conversation it was given
+CONTEXT_PHRASES = ('you mentioned', 'you said', 'you asked', 'as discussed', 'we discussed',
+                   'last time', 'your earlier', 'your previous')
+
+# Words in disease class names too common to tell questions apart
+GENERIC_DISEASE_TERMS = frozenset(('healthy', 'leaf', 'common'))
+
+def topic_vocabulary(disease_classes):
+    """CROP_TERMS plus the distinguishing words of the model's disease classes"""
+    terms = set(CROP_TERMS)
+    for name in disease_classes:
+        terms.update(tokenize(name))
+    return frozenset(terms - GENERIC_DISEASE_TERMS)
+
+def normalize_message(text):
+    """Lowercase a message and reduce it to its words, for exact matching"""
+    return ' '.join(TOKEN_PATTERN.findall(text.lower()))
+
+def is_standalone(message):
+    """Whether a question can be answered without the conversation before it.
+
+    "How do I treat potato late blight?" stands on its own; "is it still
+    the same blight?" and "what about potatoes?" do not.
+    """
+    if REFERRING_WORDS.intersection(TOKEN_PATTERN.findall(message.lower())):
+        return False
+    return len(tokenize(message)) >= 2
+
+def tokenize(text):
+    """Return content words with a light plural stem"""
+    tokens = []
+    for token in TOKEN_PATTERN.findall(text.lower()):
+        if token in STOP_WORDS:
+            continue
+        if len(token) > 3:
+            if token.endswith('ies'):
+                token = token[:-3] + 'y'
+            elif token.endswith('oes'):
+                token = token[:-2]
+            elif token.endswith('s') and not token.endswith('ss'):
+                token = token[:-1]
+        tokens.append(token)
+    return tokens
+
+class ChatResponseCache:
+    """Local answer cache for near-duplicate chat questions.
+
+    Questions are matched first on their normalized text, then by cosine
+    similarity of hashed bag-of-words vectors held in a fixed NumPy matrix,
+    so no embedding model or external service is involved. A similar match
+    only counts when both questions name the same ``topic_terms`` (crops
+    and diseases), since "tomato" and "potato" questions otherwise score
+    alike. Entries expire
+    after ``ttl`` seconds and the least recently used entry is evicted when
+    ``max_entries`` is reached.
+    """
+
+    def __init__(self, max_entries=2000, ttl=7 * 24 * 3600, threshold=0.9, dimensions=1024,
+                 topic_terms=CROP_TERMS):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.threshold = threshold
+        self.topic_terms = frozenset(topic_terms)
+        self.dimensions = dimensions
+        self._vectors = np.zeros((max_entries, dimensions), dtype=np.float32)
+        self._responses = [None] * max_entries
+        self._stored_at = np.zeros(max_entries, dtype=np.float64)
+        self._last_used = np.zeros(max_entries, dtype=np.float64)
+        self._by_text = {}
+        self._texts = [None] * max_entries
+        self._topics = [None] * max_entries
+        self._free = list(range(max_entries - 1, -1, -1))
+        self._lock = threading.Lock()
+        self._stats = {'exact_hits': 0, 'similar_hits': 0, 'misses': 0, 'evictions': 0}
+        self._miss_seconds = 0.0
+
+    def vectorize(self, text):
+        """Hash a message's content words into an L2-normalized vector"""
+        vector = np.zeros(self.dimensions, dtype=np.float32)
+        for token in tokenize(text):
+            vector[zlib.crc32(token.encode()) % self.dimensions] += 1.0
+        norm = np.linalg.norm(vector)
+        if norm:
+            vector /= norm
+        return vector
+
+    def topics(self, text):
+        """Return the crop and disease words a message mentions"""
+        return frozenset(token for token in tokenize(text) if token in self.topic_terms)
+
+    def uses_context(self, message, response, context_text):
+        """Whether a reply draws on the conversation it was given.
+
+        It does when it names crops or diseases that only the conversation
+        mentioned, or refers back to it in so many words.
+        """
+        if not context_text:
+            return False
+        borrowed = self.topics(context_text) - self.topics(message)
+        if borrowed & self.topics(response):
+            return True
+        text = response.lower()
+        return any(phrase in text for phrase in CONTEXT_PHRASES)
+
+    def get(self, message):
+        """Return a cached response for this or a similar question, or None"""
+        key = normalize_message(message)
+        now = time.time()
+        with self._lock:
+            slot = self._by_text.get(key)
+            if slot is not None and now - self._stored_at[slot] < self.ttl:
+                self._last_used[slot] = now
+                self._stats['exact_hits'] += 1
+                return self._responses[slot]
+
+            vector = self.vectorize(message)
+            if vector.any() and self._by_text:
+                scores = self._vectors @ vector
+                # Ignore expired entries
+                scores[now - self._stored_at >= self.ttl] = 0.0
+                candidates = np.flatnonzero(scores >= self.threshold)
+                topics = self.topics(message)
+                for slot in candidates[np.argsort(scores[candidates])[::-1]]:
+                    if self._topics[slot] == topics:
+                        self._last_used[slot] = now
+                        self._stats['similar_hits'] += 1
+                        return self._responses[slot]
+
+            self._stats['misses'] += 1
+            return None
+
+    def put(self, message, response, elapsed=None, stored_at=None):
+        """Cache a response; ``elapsed`` is the upstream latency it cost"""
+        key = normalize_message(message)
+        if not key:
+            return
+        now = time.time()
+        with self._lock:
+            if elapsed is not None:
+                self._miss_seconds += elapsed
+
+            slot = self._by_text.get(key)
+            if slot is None:
+                slot = self._allocate()
+                self._by_text[key] = slot
+                self._texts[slot] = key
+            self._vectors[slot] = self.vectorize(message)
+            self._topics[slot] = self.topics(message)
+            self._responses[slot] = response
+            self._stored_at[slot] = stored_at or now
+            self._last_used[slot] = now
+
+    def get_metrics(self):
+        """Return hit rate and the upstream latency saved by hits"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['entries'] = len(self._by_text)
+            miss_seconds = self._miss_seconds
+        hits = stats['exact_hits'] + stats['similar_hits']
+        lookups = hits + stats['misses']
+        avg_miss = miss_seconds / stats['misses'] if stats['misses'] else 0.0
+        stats['hit_rate'] = hits / lookups if lookups else 0.0
+        stats['avg_miss_latency_ms'] = avg_miss * 1000
+        stats['latency_saved_ms'] = hits * avg_miss * 1000
+        return stats
+
+    def _allocate(self):
+        if self._free:
+            return self._free.pop()
+        # Evict the least recently used entry
+        slot = int(np.argmin(self._last_used))
+        del self._by_text[self._texts[slot]]
+        self._stats['evictions'] += 1
+        return slot
@@ -0,0 +1,131 @@
+import html
+import logging
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from models import db, ChatHistory, ConversationSummary
+
+TAG_PATTERN = re.compile(r'<[^>]+>')
+SPACE_PATTERN = re.compile(r'\s+')
+
+def estimate_tokens(text):
+    """Cheap token estimate (about four characters per token)"""
+    return (len(text) + 3) // 4
+
+def html_to_text(markup):
+    """Strip the formatter's HTML from a stored reply"""
+    return SPACE_PATTERN.sub(' ', html.unescape(TAG_PATTERN.sub(' ', markup))).strip()
+
+class ChatContext:
+    """Prompt context for one user: a rolling summary plus recent turns"""
+
+    __slots__ = ('summary', 'turns')
+
+    def __init__(self, summary='', turns=None):
+        self.summary = summary
+        self.turns = turns or []
+
+    @property
+    def empty(self):
+        return not self.summary and not self.turns
+
+    def text(self):
+        """The summary and recent turns as one plain-text block"""
+        parts = [self.summary] if self.summary else []
+        for user_text, model_text in self.turns:
+            parts.append(user_text)
+            parts.append(model_text)
+        return '\n'.join(parts)
+
+def build_context(user_id, token_budget, max_turns):
+    """Collect the newest turns not yet summarized that fit in ``token_budget``"""
+    summary_row = db.session.get(ConversationSummary, user_id)
+    summary = summary_row.summary if summary_row else ''
+    covered_until = summary_row.covered_until if summary_row else 0
+    
+    rows = ChatHistory.query.filter(ChatHistory.user_id == user_id, ChatHistory.id > covered_until)\
+        .order_by(ChatHistory.id.desc()).limit(max_turns).all()
+    
+    budget = token_budget - estimate_tokens(summary)
+    turns = []
+    for row in rows:
+        user_text = row.user_message
+        model_text = html_to_text(row.ai_response)
+        cost = estimate_tokens(user_text) + estimate_tokens(model_text)
+        if cost > budget:
+            break
+        budget -= cost
+        turns.append((user_text, model_text))
+    turns.reverse()
+    
+    return ChatContext(summary, turns)
+
+class ConversationSummarizer:
+    """Folds older chat turns into each user's stored rolling summary.
+
+    Once a user has ``keep_turns + batch_turns`` turns that are not covered
+    by their summary, everything except the newest ``keep_turns`` is passed
+    to ``summarize(previous_summary, turns)`` on a background thread and the
+    result replaces the stored summary. Prompt size therefore stays bounded
+    by the summary length plus the recent-turn budget.
+    """
+
+    def __init__(self, app, summarize, keep_turns=6, batch_turns=4):
+        self.app = app
+        self.summarize = summarize
+        self.keep_turns = keep_turns
+        self.batch_turns = batch_turns
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='chat-summary')
+        self._pending = set()
+        self._lock = threading.Lock()
+
+    def maybe_schedule(self, user_id):
+        """Schedule a summary update if enough unsummarized turns have built up"""
+        summary_row = db.session.get(ConversationSummary, user_id)
+        covered_until = summary_row.covered_until if summary_row else 0
+        unsummarized = ChatHistory.query.filter(
+            ChatHistory.user_id == user_id, ChatHistory.id > covered_until
+        ).count()
+        if unsummarized < self.keep_turns + self.batch_turns:
+            return
+        
+        with self._lock:
+            if user_id in self._pending:
+                return
+            self._pending.add(user_id)
+        self._executor.submit(self._run, user_id)
+
+    def _run(self, user_id):
+        try:
+            with self.app.app_context():
+                summary_row = db.session.get(ConversationSummary, user_id)
+                if summary_row is None:
+                    summary_row = ConversationSummary()
+                    summary_row.user_id = user_id
+                    summary_row.summary = ''
+                    summary_row.covered_until = 0
+                
+                rows = ChatHistory.query.filter(
+                    ChatHistory.user_id == user_id, ChatHistory.id > summary_row.covered_until
+                ).order_by(ChatHistory.id).all()
+                to_fold = rows[:-self.keep_turns]
+                if not to_fold:
+                    return
+                
+                turns = [(row.user_message, html_to_text(row.ai_response)) for row in to_fold]
+                summary = self.summarize(summary_row.summary, turns)
+                if not summary:
+                    return
+                
+                summary_row.summary = summary
+                summary_row.covered_until = to_fold[-1].id
+                summary_row.updated_at = datetime.utcnow()
+                db.session.add(summary_row)
+                db.session.commit()
+        except Exception as e:
+            logging.error(f"Error summarizing conversation for user {user_id}: {e}")
+        finally:
+            with self._lock:
+                self._pending.discard(user_id)
@@ -0,0 +1,162 @@
+import json
+import logging
+import os
+import threading
+import time
+from collections import Counter, defaultdict
+from datetime import datetime, timezone
+
+from chat_cache import tokenize
+from plant_disease_model import DISEASE_CLASSES, TREATMENT_RECOMMENDATIONS
+
+class CropKnowledge:
+    """Crop care guides compiled for lookup and search.
+
+    Built once from the parsed crop_care_data.json: crop names resolve
+    case-insensitively, every care tip, planting fact, harvesting note and
+    common problem (plus the treatment notes of the crop's diseases) is a
+    searchable snippet in an inverted index, and crops are cross-linked
+    with the detection model's disease classes. ``version`` identifies the
+    source file revision (its mtime in nanoseconds).
+    """
+
+    def __init__(self, crops, version=None):
+        self.crops = crops
+        self.version = version
+        self.modified_at = datetime.fromtimestamp(version // 10**9, timezone.utc) if version else None
+        self.names = sorted(crops)
+        self._canonical = {name.lower(): name for name in crops}
+
+        # Just what the crop listing page shows
+        self.summaries = {
+            name: {
+                'planting': {'season': info.get('planting', {}).get('season', '')},
+                'harvesting': {'time': info.get('harvesting', {}).get('time', '')}
+            }
+            for name, info in crops.items()
+        }
+
+        # Crop <-> disease classes, by the crop name leading each class name
+        self.diseases_by_crop = {name: [] for name in crops}
+        self.crop_by_disease = {}
+        for disease in DISEASE_CLASSES:
+            crop = self._canonical.get(disease.split(' ', 1)[0].lower())
+            if crop is not None:
+                self.diseases_by_crop[crop].append(disease)
+                self.crop_by_disease[disease] = crop
+
+        self._snippets = []
+        for name, info in crops.items():
+            for section in ('planting', 'care', 'harvesting'):
+                for field, text in info.get(section, {}).items():
+                    self._snippets.append((name, section, field, text))
+            for problem in info.get('common_problems', []):
+                self._snippets.append((name, 'common_problems', None, problem))
+            for disease in self.diseases_by_crop[name]:
+                if disease in TREATMENT_RECOMMENDATIONS:
+                    recommendation = TREATMENT_RECOMMENDATIONS[disease]
+                    text = f"{disease}: {recommendation['treatment']} {recommendation['prevention']}"
+                    self._snippets.append((name, 'diseases', disease, text))
+
+        # token -> ids of the snippets containing it; crop names match their own snippets
+        postings = defaultdict(set)
+        for snippet_id, (name, section, field, text) in enumerate(self._snippets):
+            for token in tokenize(f"{name} {field or ''} {text}".replace('_', ' ')):
+                postings[token].add(snippet_id)
+        self._postings = {token: frozenset(ids) for token, ids in postings.items()}
+
+    def canonical(self, crop_name):
+        """Return the stored spelling of a crop name, or None if unknown"""
+        if not crop_name:
+            return None
+        return self._canonical.get(crop_name.strip().lower())
+
+    def get(self, crop_name):
+        """Return the care guide for a crop, matching its name case-insensitively"""
+        name = self.canonical(crop_name)
+        return self.crops[name] if name else None
+
+    def search(self, query, limit=10):
+        """Return snippets matching every query word, then those matching most of them"""
+        tokens = set(tokenize(query))
+        if not tokens:
+            return []
+        postings = [self._postings.get(token, frozenset()) for token in tokens]
+
+        matches = sorted(frozenset.intersection(*postings))
+        if len(matches) < limit and len(postings) > 1:
+            partial = Counter(snippet_id for ids in postings for snippet_id in ids)
+            matched = set(matches)
+            matches += sorted(
+                (snippet_id for snippet_id in partial if snippet_id not in matched),
+                key=lambda snippet_id: (-partial[snippet_id], snippet_id)
+            )
+
+        results = []
+        for snippet_id in matches[:limit]:
+            name, section, field, text = self._snippets[snippet_id]
+            results.append({'crop': name, 'section': section, 'field': field, 'text': text})
+        return results
+
+class CropKnowledgeStore:
+    """Holds the current CropKnowledge and rebuilds it when the JSON changes.
+
+    ``current()`` checks the file's modification time at most every
+    ``check_interval`` seconds; a changed file is compiled into a new
+    CropKnowledge that replaces the old one in a single assignment, so
+    readers never see a partial build. If the new file cannot be loaded the
+    previous knowledge is kept. ``on_reload`` callbacks are called after
+    each successful rebuild.
+    """
+
+    def __init__(self, path, check_interval=2.0):
+        self.path = path
+        self.check_interval = check_interval
+        self.on_reload = []
+        self._lock = threading.Lock()
+        self._mtime = None
+        self._checked_at = 0.0
+        self._knowledge = CropKnowledge({})
+        self._reload()
+
+    def current(self):
+        """Return the latest compiled knowledge, reloading it if the file changed"""
+        now = time.monotonic()
+        if now - self._checked_at >= self.check_interval and self._lock.acquire(blocking=False):
+            try:
+                self._checked_at = now
+                if self._file_mtime() != self._mtime:
+                    self._reload()
+            finally:
+                self._lock.release()
+        return self._knowledge
+
+    def _file_mtime(self):
+        try:
+            return os.stat(self.path).st_mtime_ns
+        except OSError:
+            return None
+
+    def _reload(self):
+        mtime = self._file_mtime()
+        try:
+            with open(self.path, 'r') as f:
+                crops = json.load(f)
+            knowledge = CropKnowledge(crops, version=mtime)
+        except FileNotFoundError:
+            logging.warning(f"{os.path.basename(self.path)} not found")
+            self._mtime = mtime
+            return
+        except Exception as e:
+            logging.error(f"Error loading crop care data: {e}")
+            self._mtime = mtime
+            return
+
+        self._knowledge = knowledge
+        self._mtime = mtime
+        logging.info(f"Loaded crop care data for {len(crops)} crops")
+        for callback in self.on_reload:
+            try:
+                callback()
+            except Exception as e:
+                logging.error(f"Error handling crop care reload: {e}")
@@ -0,0 +1,56 @@
+import os
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine, make_url
+
+DEFAULT_DATABASE_URL = 'sqlite:///plant_disease_app.db'
+
+def database_url():
+    """Return the configured database URL (env DATABASE_URL)"""
+    url = os.environ.get('DATABASE_URL') or DEFAULT_DATABASE_URL
+    # Some hosts still hand out the pre-SQLAlchemy-1.4 scheme
+    if url.startswith('postgres://'):
+        url = 'postgresql://' + url[len('postgres://'):]
+    return url
+
+def sqlite_pragmas():
+    """PRAGMAs applied to every new SQLite connection, tuned for concurrent writers"""
+    return {
+        # Readers never block the writer and vice versa
+        'journal_mode': os.environ.get('SQLITE_JOURNAL_MODE', 'WAL'),
+        # With WAL, NORMAL only risks the last commits on power loss, never corruption
+        'synchronous': os.environ.get('SQLITE_SYNCHRONOUS', 'NORMAL'),
+        'busy_timeout': int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', 5000)),
+        'mmap_size': int(os.environ.get('SQLITE_MMAP_SIZE', 256 * 1024 * 1024)),
+    }
+
+def engine_options(url):
+    """SQLALCHEMY_ENGINE_OPTIONS for the configured backend"""
+    if make_url(url).get_backend_name() == 'sqlite':
+        return {
+            # Wait for the write lock in Python too, not just in SQLite
+            'connect_args': {'timeout': sqlite_pragmas()['busy_timeout'] / 1000, 'check_same_thread': False},
+        }
+    return {
+        'pool_size': int(os.environ.get('DB_POOL_SIZE', 10)),
+        'max_overflow': int(os.environ.get('DB_MAX_OVERFLOW', 20)),
+        'pool_timeout': int(os.environ.get('DB_POOL_TIMEOUT', 30)),
+        'pool_recycle': int(os.environ.get('DB_POOL_RECYCLE', 1800)),
+        # Drop connections the server closed while they sat idle in the pool
+        'pool_pre_ping': True,
+    }
+
+@event.listens_for(Engine, 'connect')
+def apply_sqlite_pragmas(dbapi_connection, connection_record):
+    """Tune each new SQLite connection; other backends are left alone"""
+    if type(dbapi_connection).__module__.split('.')[0] != 'sqlite3':
+        return
+    pragmas = sqlite_pragmas()
+    cursor = dbapi_connection.cursor()
+    database = cursor.execute('PRAGMA database_list').fetchone()[2]
+    for name, value in pragmas.items():
+        if name == 'journal_mode' and not database:
+            # In-memory databases cannot use WAL
+            continue
+        cursor.execute(f'PRAGMA {name}={value}')
+    cursor.close()
@@ -0,0 +1,173 @@
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+def content_hash(data):
+    """Return the SHA-256 hex digest of the uploaded image bytes"""
+    return hashlib.sha256(data).hexdigest()
+
+def perceptual_hash(image_tensor, data_format='channels_last'):
+    """Compute a 64-bit difference hash from a normalized image tensor.
+
+    The image is reduced to a 9x8 grayscale grid and each bit records whether
+    a cell is brighter than its right-hand neighbour, so re-encoded or
+    slightly resized copies of a photo produce (nearly) the same hash. Cells
+    are equal-sized blocks of the centre of the image; the few leftover
+    pixels at the edges are ignored.
+
+    The grid is far too coarse to see lesions, so a diseased leaf can hash
+    within a couple of bits of the same leaf healthy; only use near matches
+    with a very small distance, if at all.
+    """
+    if data_format == 'channels_first':
+        gray = image_tensor.mean(axis=0)
+    else:
+        gray = image_tensor.mean(axis=2)
+    h, w = gray.shape
+    cell_h, cell_w = h // 8, w // 9
+    top, left = (h - 8 * cell_h) // 2, (w - 9 * cell_w) // 2
+    grid = gray[top:top + 8 * cell_h, left:left + 9 * cell_w].reshape(8, cell_h, 9, cell_w).mean(axis=(1, 3))
+    bits = (grid[:, 1:] > grid[:, :-1]).ravel()
+    return int(np.packbits(bits).view('>u8')[0])
+
+class DetectionCache:
+    """Prediction cache keyed by image content hash.
+
+    Results live in an in-memory LRU bounded by ``max_entries`` and, when
+    ``db_path`` is set, in a SQLite table that survives restarts and keeps the
+    ``max_db_entries`` most recently stored rows. Entries are
+    scoped to ``model_version``; persisted rows from other versions are
+    dropped on startup. With ``phash_distance`` > 0 (opt-in), a miss on the
+    exact hash falls back to the nearest perceptual hash within that Hamming
+    distance.
+    """
+
+    def __init__(self, model_version, max_entries=1024, db_path=None, phash_distance=0, max_db_entries=100000):
+        self.model_version = model_version
+        self.max_entries = max_entries
+        self.max_db_entries = max_db_entries
+        self.phash_distance = phash_distance
+        self._entries = OrderedDict()
+        self._phashes = {}
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'near_hits': 0, 'misses': 0, 'evictions': 0, 'db_evictions': 0}
+        self._conn = None
+        if db_path:
+            self._open_db(db_path)
+
+    def _open_db(self, db_path):
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS detection_cache ('
+            'content_hash TEXT PRIMARY KEY, model_version TEXT NOT NULL, '
+            'phash INTEGER, result TEXT NOT NULL)'
+        )
+        deleted = self._conn.execute(
+            'DELETE FROM detection_cache WHERE model_version != ?', (self.model_version,)
+        ).rowcount
+        self._trim_db()
+        self._conn.commit()
+        if deleted:
+            logging.info(f"Invalidated {deleted} cached detections from previous model versions")
+
+        # Warm the memory tier with the most recent persisted entries
+        rows = self._conn.execute(
+            'SELECT content_hash, phash, result FROM detection_cache ORDER BY rowid DESC LIMIT ?',
+            (self.max_entries,)
+        ).fetchall()
+        for digest, phash, result in reversed(rows):
+            self._remember(digest, json.loads(result), phash)
+
+    def get(self, digest):
+        """Return the cached prediction for exactly these image bytes, or None"""
+        with self._lock:
+            result = self._entries.get(digest)
+            if result is not None:
+                self._entries.move_to_end(digest)
+                self._stats['hits'] += 1
+                return result
+
+            if self._conn is not None:
+                row = self._conn.execute(
+                    'SELECT phash, result FROM detection_cache WHERE content_hash = ?', (digest,)
+                ).fetchone()
+                if row is not None:
+                    result = json.loads(row[1])
+                    self._remember(digest, result, row[0])
+                    self._stats['hits'] += 1
+                    return result
+
+            return None
+
+    def get_similar(self, phash):
+        """Return the prediction for a near-identical image, or None"""
+        if self.phash_distance <= 0:
+            return None
+        with self._lock:
+            if not self._phashes:
+                return None
+            match = self._nearest(phash & ((1 << 64) - 1))
+            if match is None:
+                return None
+            self._entries.move_to_end(match)
+            self._stats['near_hits'] += 1
+            return self._entries[match]
+
+    def set(self, digest, result, phash=None):
+        """Store a freshly computed prediction for an image"""
+        with self._lock:
+            # Only misses are ever stored, so count them here
+            self._stats['misses'] += 1
+            self._remember(digest, result, phash)
+            if self._conn is not None:
+                # SQLite INTEGER is signed 64-bit
+                stored_phash = None if phash is None else phash - (1 << 64) if phash >= 1 << 63 else phash
+                self._conn.execute(
+                    'INSERT OR REPLACE INTO detection_cache (content_hash, model_version, phash, result) '
+                    'VALUES (?, ?, ?, ?)',
+                    (digest, self.model_version, stored_phash, json.dumps(result))
+                )
+                self._trim_db()
+                self._conn.commit()
+
+    def get_metrics(self):
+        """Return hit/miss counters and current size"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['entries'] = len(self._entries)
+        lookups = stats['hits'] + stats['near_hits'] + stats['misses']
+        stats['hit_rate'] = (stats['hits'] + stats['near_hits']) / lookups if lookups else 0.0
+        stats['model_version'] = self.model_version
+        return stats
+
+    def _remember(self, digest, result, phash):
+        self._entries[digest] = result
+        self._entries.move_to_end(digest)
+        if phash is not None:
+            self._phashes[digest] = phash & ((1 << 64) - 1)
+        while len(self._entries) > self.max_entries:
+            evicted, _ = self._entries.popitem(last=False)
+            self._phashes.pop(evicted, None)
+            self._stats['evictions'] += 1
+
+    def _trim_db(self):
+        # Replacing a row gives it a new rowid, so the oldest rowids are the
+        # least recently stored entries
+        self._stats['db_evictions'] += self._conn.execute(
+            'DELETE FROM detection_cache WHERE rowid <= (SELECT max(rowid) FROM detection_cache) - ?',
+            (self.max_db_entries,)
+        ).rowcount
+
+    def _nearest(self, phash):
+        digests = list(self._phashes)
+        hashes = np.fromiter(self._phashes.values(), dtype=np.uint64, count=len(digests))
+        distances = np.bitwise_count(hashes ^ np.uint64(phash))
+        best = int(np.argmin(distances))
+        if distances[best] <= self.phash_distance:
+            return digests[best]
+        return None
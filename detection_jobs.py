@@ -0,0 +1,112 @@
+import json
+import logging
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from models import db, Detection, DetectionJob
+
+ACTIVE_STATUSES = ('queued', 'running')
+
+class DetectionJobQueue:
+    """Background detection jobs backed by the DetectionJob table.
+
+    The table itself is the queue, so no external broker is needed: submit()
+    inserts a 'queued' row and hands its id to a thread pool. A worker claims
+    the row with a conditional UPDATE (so only one process ever runs a job),
+    calls ``handler(job)`` for the prediction and records the result together
+    with its Detection row, or the error. ``on_detection(detection)``, if
+    given, is called after a job's Detection row has been committed.
+    """
+
+    def __init__(self, app, handler, max_workers=2, stale_after=300, on_detection=None):
+        self.app = app
+        self.handler = handler
+        self.on_detection = on_detection
+        self.stale_after = timedelta(seconds=stale_after)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='detection-job')
+
+    def submit(self, user_id, image_path):
+        """Persist a new job and schedule it; returns the job row"""
+        job = DetectionJob()
+        job.id = uuid.uuid4().hex
+        job.user_id = user_id
+        job.image_path = image_path
+        job.status = 'queued'
+        db.session.add(job)
+        db.session.commit()
+        self._executor.submit(self._run, job.id)
+        return job
+
+    def resume(self):
+        """Re-schedule jobs left unfinished by a previous process"""
+        stale = datetime.utcnow() - self.stale_after
+        DetectionJob.query.filter(
+            DetectionJob.status == 'running', DetectionJob.updated_at < stale
+        ).update({'status': 'queued'}, synchronize_session=False)
+        db.session.commit()
+
+        job_ids = [job_id for (job_id,) in db.session.query(DetectionJob.id).filter_by(status='queued')]
+        for job_id in job_ids:
+            self._executor.submit(self._run, job_id)
+        if job_ids:
+            logging.info(f"Resumed {len(job_ids)} queued detection jobs")
+
+    def _claim(self, job_id):
+        claimed = DetectionJob.query.filter_by(id=job_id, status='queued').update(
+            {'status': 'running', 'updated_at': datetime.utcnow()}, synchronize_session=False
+        )
+        db.session.commit()
+        return claimed == 1
+
+    def _run(self, job_id):
+        with self.app.app_context():
+            try:
+                if not self._claim(job_id):
+                    return
+                job = db.session.get(DetectionJob, job_id)
+                prediction = self.handler(job)
+                if prediction is None:
+                    raise ValueError('Error processing image')
+
+                detection = Detection()
+                detection.user_id = job.user_id
+                detection.disease_name = prediction['disease']
+                detection.confidence = prediction['confidence']
+                detection.treatment = prediction['treatment']
+                detection.image_path = job.image_path
+                db.session.add(detection)
+                db.session.flush()
+
+                job.detection_id = detection.id
+                job.result = json.dumps(prediction)
+                job.status = 'done'
+            except Exception as e:
+                logging.error(f"Error running detection job {job_id}: {e}")
+                db.session.rollback()
+                job = db.session.get(DetectionJob, job_id)
+                if job is None:
+                    return
+                job.status = 'failed'
+                job.error = 'Error analyzing image. Please try again.'
+            job.updated_at = datetime.utcnow()
+            db.session.commit()
+            
+            if self.on_detection is not None and job.status == 'done':
+                try:
+                    self.on_detection(db.session.get(Detection, job.detection_id))
+                except Exception as e:
+                    logging.error(f"Error handling detection from job {job_id}: {e}")
+
+def serialize_job(job):
+    """Return the JSON-safe status of a detection job"""
+    return {
+        'id': job.id,
+        'status': job.status,
+        'image_path': job.image_path,
+        'prediction': json.loads(job.result) if job.result else None,
+        'error': job.error,
+        'detection_id': job.detection_id,
+        'created_at': job.created_at.isoformat() if job.created_at else None,
+        'updated_at': job.updated_at.isoformat() if job.updated_at else None
+    }
@@ -0,0 +1,185 @@
+import logging
+import os
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from models import db, Detection, DetectionReview
+from plant_disease_model import DISEASE_PROFILES
+
+PROFILES_BY_DISEASE = {profile.disease: profile for profile in DISEASE_PROFILES}
+
+class DetectionEscalator:
+    """Escalates low-confidence local detections to Gemini Vision.
+
+    The local model answers every request. When its confidence is below
+    ``threshold``, a pending DetectionReview row is attached to the
+    Detection and ``analyze(image_path)`` runs on a background thread. It
+    returns ``(analysis_html, diagnosis)`` or None on failure, where
+    ``diagnosis`` is a ``(disease, confidence)`` pair or None. The analysis
+    is stored on the review, and a diagnosis replaces the Detection's
+    disease and confidence (the local ones are kept on the review).
+
+    Reviews are shared by image content: a repeat upload of an image that
+    already has a finished or pending review gets a copy of it rather than
+    another Gemini call. To keep upstream cost bounded, no more than
+    ``max_rate`` of the last ``window`` detections are escalated.
+    """
+
+    def __init__(self, app, analyze, threshold=0.6, max_rate=0.25, window=200, max_workers=2):
+        self.app = app
+        self.analyze = analyze
+        self.threshold = threshold
+        self.max_rate = max_rate
+        self._recent = deque(maxlen=window)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='detection-review')
+        self._lock = threading.Lock()
+        self._stats = {
+            'detections': 0,
+            'low_confidence': 0,
+            'escalated': 0,
+            'reused': 0,
+            'skipped_over_budget': 0,
+            'reviewed': 0,
+            'failed': 0,
+        }
+
+    def consider(self, detection):
+        """Escalate a freshly saved Detection if the local model was unsure.
+
+        Returns True when a review is attached to it (new, or shared with an
+        earlier upload of the same image).
+        """
+        low_confidence = detection.confidence < self.threshold
+        digest = detection.image_path.rsplit('.', 1)[0] if detection.image_path else None
+        existing = None
+        if low_confidence and digest:
+            existing = DetectionReview.query.filter(
+                DetectionReview.content_hash == digest, DetectionReview.status.in_(('pending', 'done'))
+            ).order_by(DetectionReview.created_at.desc()).first()
+
+        with self._lock:
+            self._stats['detections'] += 1
+            escalate = low_confidence and existing is None and self._window_rate() < self.max_rate
+            self._recent.append(escalate)
+            if low_confidence:
+                self._stats['low_confidence'] += 1
+                if existing is not None:
+                    self._stats['reused'] += 1
+                else:
+                    self._stats['escalated' if escalate else 'skipped_over_budget'] += 1
+        if not escalate and existing is None:
+            return False
+
+        review = DetectionReview()
+        review.detection_id = detection.id
+        review.content_hash = digest
+        review.status = 'pending'
+        db.session.add(review)
+        if existing is not None and existing.status == 'done':
+            self._complete(review, detection, existing.analysis, self._diagnosis_of(existing))
+        db.session.commit()
+        if escalate:
+            self._executor.submit(self._run, detection.id)
+        elif review.status == 'pending' and existing.status != 'pending':
+            # The running review fills in waiting uploads of its image; this
+            # one was committed after it finished
+            if existing.status == 'done':
+                self._complete(review, detection, existing.analysis, self._diagnosis_of(existing))
+            else:
+                review.status = existing.status
+            db.session.commit()
+        return True
+
+    def resume(self):
+        """Re-schedule reviews left pending by a previous process, one per image"""
+        detection_ids = []
+        seen = set()
+        for detection_id, digest in db.session.query(
+                DetectionReview.detection_id, DetectionReview.content_hash).filter_by(status='pending'):
+            if digest is None or digest not in seen:
+                seen.add(digest)
+                detection_ids.append(detection_id)
+        for detection_id in detection_ids:
+            self._executor.submit(self._run, detection_id)
+        if detection_ids:
+            logging.info(f"Resumed {len(detection_ids)} pending detection reviews")
+
+    def get_metrics(self):
+        """Return escalation counters and rates"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['window_escalation_rate'] = self._window_rate()
+        stats['threshold'] = self.threshold
+        stats['max_rate'] = self.max_rate
+        stats['escalation_rate'] = stats['escalated'] / stats['detections'] if stats['detections'] else 0.0
+        return stats
+
+    def _window_rate(self):
+        return sum(self._recent) / len(self._recent) if self._recent else 0.0
+
+    def _run(self, detection_id):
+        with self.app.app_context():
+            review = db.session.get(DetectionReview, detection_id)
+            detection = db.session.get(Detection, detection_id)
+            if review is None or detection is None or review.status != 'pending':
+                return
+            try:
+                result = self.analyze(os.path.join(self.app.config['UPLOAD_FOLDER'], detection.image_path))
+                if not result or not result[0]:
+                    raise ValueError('No analysis returned')
+                analysis, diagnosis = result
+                outcome = 'reviewed'
+            except Exception as e:
+                logging.error(f"Error reviewing detection {detection_id}: {e}")
+                analysis = diagnosis = None
+                outcome = 'failed'
+
+            # Fill in every upload of this image that was waiting on the review
+            waiting = [review]
+            if review.content_hash:
+                waiting = DetectionReview.query.filter_by(content_hash=review.content_hash, status='pending').all()
+            for pending in waiting:
+                if outcome == 'reviewed':
+                    self._complete(pending, pending.detection, analysis, diagnosis)
+                else:
+                    pending.status = 'failed'
+                    pending.updated_at = datetime.utcnow()
+            db.session.commit()
+            with self._lock:
+                self._stats[outcome] += 1
+
+    @staticmethod
+    def _diagnosis_of(review):
+        if review.disease_name is None:
+            return None
+        return review.disease_name, review.confidence
+
+    @staticmethod
+    def _complete(review, detection, analysis, diagnosis):
+        """Store a finished review and apply its diagnosis to the Detection"""
+        review.analysis = analysis
+        review.status = 'done'
+        review.updated_at = datetime.utcnow()
+        if diagnosis is None or detection is None:
+            return
+        review.disease_name, review.confidence = diagnosis
+        review.local_disease_name = detection.disease_name
+        review.local_confidence = detection.confidence
+        detection.disease_name, detection.confidence = diagnosis
+        detection.treatment = PROFILES_BY_DISEASE[detection.disease_name].treatment
+
+def serialize_review(review):
+    """Return the JSON-safe state of a detection's Gemini review"""
+    if review is None:
+        return {'status': 'none'}
+    return {
+        'status': review.status,
+        'analysis': review.analysis,
+        'disease': review.disease_name,
+        'confidence': review.confidence,
+        'local_disease': review.local_disease_name,
+        'local_confidence': review.local_confidence,
+        'updated_at': review.updated_at.isoformat() if review.updated_at else None
+    }
@@ -1,17 +1,17 @@
+import html
 import json
 import logging
 import os
+import re
+import time
 from google import genai
 from google.genai import types
 
-# Initialize Gemini client
-client = genai.Client(api_key=os.environ.get("GEMINI_API_KEY", "PASTE_YOUR_HARDCODED_GEMINI_API_KEY"))
+from gemini_client import FakeStreamingClient, GeminiUnavailableError, ResilientClient
+from image_preparation import PreparedImageCache
 
-def get_ai_response(user_message):
-    """Get AI response for agricultural questions using Gemini"""
-    try:
-        # System prompt for agricultural assistant
-        system_prompt = """You are an expert agricultural assistant specializing in:
+# System prompt for agricultural assistant
+SYSTEM_PROMPT = """You are an expert agricultural assistant specializing in:
         - Plant disease identification and treatment
         - Crop care and farming best practices
         - Pest management and prevention
@@ -26,124 +26,311 @@ def get_ai_response(user_message):
         - Bold important terms with **bold text**
         - Provide complete, detailed responses
         Always prioritize plant and human safety and give comprehensive answers."""
-        
-        # Create the content with system instruction
-        response = client.models.generate_content(
-            model="gemini-2.5-flash",
-            contents=[
-                types.Content(role="user", parts=[types.Part(text=user_message)])
-            ],
-            config=types.GenerateContentConfig(
-                system_instruction=system_prompt,
-                temperature=0.7,
-                max_output_tokens=2000
-            )
+
+# Replies used when the model gives no usable answer; these are never cached
+EMPTY_RESPONSE = "I'm sorry, I couldn't generate a response. Please try again."
+ERROR_RESPONSE = "I'm experiencing technical difficulties. Please try again later."
+UNAVAILABLE_RESPONSE = "The assistant is very busy right now. Please try again in a minute."
+FALLBACK_RESPONSES = frozenset([EMPTY_RESPONSE, ERROR_RESPONSE, UNAVAILABLE_RESPONSE])
+IMAGE_EMPTY_RESPONSE = "Unable to analyze the image."
+IMAGE_ERROR_RESPONSE = "Error analyzing image. Please try again."
+IMAGE_FALLBACK_RESPONSES = frozenset([IMAGE_EMPTY_RESPONSE, IMAGE_ERROR_RESPONSE])
+
+# Limits for calls to Gemini (seconds unless noted)
+GEMINI_TIMEOUT = float(os.environ.get("GEMINI_TIMEOUT", 60))
+GEMINI_MAX_CONCURRENCY = int(os.environ.get("GEMINI_MAX_CONCURRENCY", 8))
+GEMINI_QUEUE_TIMEOUT = float(os.environ.get("GEMINI_QUEUE_TIMEOUT", 5))
+GEMINI_BREAKER_FAILURES = int(os.environ.get("GEMINI_BREAKER_FAILURES", 5))
+GEMINI_BREAKER_RESET = float(os.environ.get("GEMINI_BREAKER_RESET", 30))
+# Hedge slow gemini-2.5-pro calls with gemini-2.5-flash after this long (0 disables)
+GEMINI_HEDGE_AFTER = float(os.environ.get("GEMINI_HEDGE_AFTER", 20))
+
+# Images sent to Gemini Vision are downscaled to this long edge and re-encoded
+GEMINI_IMAGE_MAX_EDGE = int(os.environ.get("GEMINI_IMAGE_MAX_EDGE", 1536))
+GEMINI_IMAGE_QUALITY = int(os.environ.get("GEMINI_IMAGE_QUALITY", 85))
+GEMINI_IMAGE_CACHE_SIZE = int(os.environ.get("GEMINI_IMAGE_CACHE_SIZE", 64))
+
+# Initialize Gemini client (GEMINI_FAKE=1 uses canned replies for offline development)
+if os.environ.get("GEMINI_FAKE"):
+    transport = FakeStreamingClient(delay=0.05)
+else:
+    transport = genai.Client(
+        api_key=os.environ.get("GEMINI_API_KEY", "PASTE_YOUR_HARDCODED_GEMINI_API_KEY"),
+        # Bounds abandoned calls too; the HTTP timeout is in milliseconds
+        http_options=types.HttpOptions(timeout=int(GEMINI_TIMEOUT * 1000))
+    )
+
+client = ResilientClient(
+    transport,
+    max_concurrency=GEMINI_MAX_CONCURRENCY,
+    timeout=GEMINI_TIMEOUT,
+    queue_timeout=GEMINI_QUEUE_TIMEOUT,
+    failure_threshold=GEMINI_BREAKER_FAILURES,
+    reset_timeout=GEMINI_BREAKER_RESET,
+    fallbacks={"gemini-2.5-pro": "gemini-2.5-flash"},
+    hedge_after=GEMINI_HEDGE_AFTER or None
+)
+
+prepared_images = PreparedImageCache(
+    max_entries=GEMINI_IMAGE_CACHE_SIZE,
+    max_edge=GEMINI_IMAGE_MAX_EDGE,
+    quality=GEMINI_IMAGE_QUALITY
+)
+
+def chat_request(user_message, context=None):
+    """Build the model arguments shared by blocking and streaming chat calls.
+
+    ``context`` (a ChatContext) contributes the user's conversation summary
+    to the system instruction and replays their recent turns.
+    """
+    system_instruction = SYSTEM_PROMPT
+    contents = []
+    if context is not None:
+        if context.summary:
+            system_instruction += "\n\nSummary of the earlier conversation with this user:\n" + context.summary
+        for user_text, model_text in context.turns:
+            contents.append(types.Content(role="user", parts=[types.Part(text=user_text)]))
+            contents.append(types.Content(role="model", parts=[types.Part(text=model_text)]))
+    contents.append(types.Content(role="user", parts=[types.Part(text=user_message)]))
+    
+    return {
+        'model': "gemini-2.5-flash",
+        'contents': contents,
+        'config': types.GenerateContentConfig(
+            system_instruction=system_instruction,
+            temperature=0.7,
+            max_output_tokens=2000
         )
+    }
+
+def get_ai_response(user_message, context=None):
+    """Get AI response for agricultural questions using Gemini"""
+    try:
+        # Create the content with system instruction
+        response = client.models.generate_content(**chat_request(user_message, context))
         
         if response.text:
             # Format the response for better display
             formatted_response = format_ai_response(response.text)
             return formatted_response
         else:
-            return "I'm sorry, I couldn't generate a response. Please try again."
-            
+            return EMPTY_RESPONSE
+    
+    except GeminiUnavailableError as e:
+        logging.warning(f"Gemini unavailable for chat: {e}")
+        return UNAVAILABLE_RESPONSE
     except Exception as e:
         logging.error(f"Error getting AI response: {e}")
-        return "I'm experiencing technical difficulties. Please try again later."
+        return ERROR_RESPONSE
+
+def stream_ai_response(user_message, context=None):
+    """Stream an AI response as HTML fragments, one per completed paragraph.
+
+    Joining the yielded fragments gives the same markup as formatting the
+    whole reply at once.
+    """
+    formatter = ResponseFormatter()
+    produced = False
+    try:
+        for chunk in client.models.generate_content_stream(**chat_request(user_message, context)):
+            # Emit every paragraph that is known to be complete
+            fragment = formatter.feed(chunk.text or '')
+            if fragment:
+                produced = True
+                yield fragment
+        
+        fragment = formatter.finish()
+        if fragment:
+            yield fragment
+        elif not produced:
+            yield EMPTY_RESPONSE
+    
+    except GeminiUnavailableError as e:
+        logging.warning(f"Gemini unavailable for chat: {e}")
+        yield UNAVAILABLE_RESPONSE
+    except Exception as e:
+        logging.error(f"Error streaming AI response: {e}")
+        yield ERROR_RESPONSE
+
+def summarize_conversation(previous_summary, turns, max_tokens=300):
+    """Fold chat turns into a short running summary, or return None on failure"""
+    try:
+        transcript = '\n'.join(f"Farmer: {user_text}\nAssistant: {model_text}" for user_text, model_text in turns)
+        prompt = (
+            "Update the running summary of a conversation between a farmer and an agricultural assistant. "
+            "Keep the crops, locations, symptoms, diagnoses and advice that later questions may refer to. "
+            f"Reply with the summary only, in under {max_tokens * 3 // 4} words.\n\n"
+            f"Current summary:\n{previous_summary or '(none)'}\n\nNew exchanges:\n{transcript}"
+        )
+        response = client.models.generate_content(
+            model="gemini-2.5-flash",
+            contents=[types.Content(role="user", parts=[types.Part(text=prompt)])],
+            config=types.GenerateContentConfig(temperature=0.2, max_output_tokens=max_tokens)
+        )
+        return response.text.strip() if response.text else None
+    except Exception as e:
+        logging.error(f"Error summarizing conversation: {e}")
+        return None
+
+# Inline and block markdown patterns, compiled once
+BOLD_PATTERN = re.compile(r'\*\*(.*?)\*\*')
+ITALIC_PATTERN = re.compile(r'\*(.*?)\*')
+NUMBERED_PATTERN = re.compile(r'\d+\.')
+BULLET_PATTERN = re.compile(r'[*•-]\s*')
+BULLET_CHARS = '*•-'
+
+class ResponseFormatter:
+    """Single-pass markdown-to-HTML formatter for model replies.
+
+    Text can be fed in arbitrary chunks; ``feed`` returns the HTML for every
+    paragraph completed so far and ``finish`` flushes the last one. Each
+    batch of complete lines is escaped and inline-formatted in one pass, and
+    list continuations are collected per item rather than rebuilt, so cost
+    is linear in the length of the reply.
+    """
+
+    def __init__(self):
+        self._partial_line = ''
+        self._kind = None
+        self._items = []
+
+    def feed(self, chunk):
+        text = self._partial_line + chunk
+        end = text.rfind('\n')
+        if end < 0:
+            self._partial_line = text
+            return ''
+        self._partial_line = text[end + 1:]
+        output = []
+        self._add_lines(text[:end], output)
+        return ''.join(output)
+
+    def finish(self):
+        output = []
+        if self._partial_line:
+            self._add_lines(self._partial_line, output)
+            self._partial_line = ''
+        self._flush(output)
+        return ''.join(output)
+
+    def _add_lines(self, text, output):
+        items = self._items
+        for line in format_inline(text).split('\n'):
+            line = line.strip()
+            if not line:
+                if items:
+                    self._flush(output)
+                    items = self._items
+                continue
+
+            # The first line decides how the paragraph is rendered
+            numbered = line[0].isdigit() and NUMBERED_PATTERN.match(line) is not None
+            bullet = not numbered and line[0] in BULLET_CHARS
+            if self._kind is None:
+                self._kind = 'numbered' if numbered else 'bullet' if bullet else 'text'
+
+            if self._kind == 'text':
+                items.append(line)
+            elif numbered and self._kind == 'numbered':
+                items.append(['<strong class="text-success">', line, '</strong>'])
+            elif bullet and self._kind == 'bullet':
+                items.append(['<span class="text-success me-2">•</span>', line[BULLET_PATTERN.match(line).end():]])
+            elif items:
+                # Continuation of the previous list item
+                items[-1].append(' ' + line)
+            else:
+                items.append([line])
+
+    def _flush(self, output):
+        if self._kind == 'text':
+            output.append('<div class="mb-3">' + '<br>'.join(self._items) + '</div>')
+        elif self._items:
+            output.append('<div class="mb-3"><div class="mb-2">')
+            output.append('</div><div class="mb-2">'.join(''.join(item) for item in self._items))
+            output.append('</div></div>')
+        self._kind = None
+        self._items = []
+
+def format_inline(text):
+    """Escape model text and apply bold/italic markup"""
+    text = html.escape(text, quote=False)
+    if '*' in text:
+        text = BOLD_PATTERN.sub(r'<strong class="text-primary">\1</strong>', text)
+        text = ITALIC_PATTERN.sub(r'<em>\1</em>', text)
+    return text
 
 def format_ai_response(text):
     """Format AI response text for better HTML display"""
-    import re
-    
     if not text or not text.strip():
         return "No response generated."
     
-    # Clean up the text first
-    formatted = text.strip()
-    
-    # Format bold text (markdown style) - do this first
-    formatted = re.sub(r'\*\*(.*?)\*\*', r'<strong class="text-primary">\1</strong>', formatted)
-    
-    # Format italic text
-    formatted = re.sub(r'\*(.*?)\*', r'<em>\1</em>', formatted)
-    
-    # Split into paragraphs and handle each
-    paragraphs = formatted.split('\n\n')
-    formatted_paragraphs = []
-    
-    for paragraph in paragraphs:
-        if not paragraph.strip():
-            continue
-            
-        # Handle numbered lists
-        if re.search(r'^\d+\.', paragraph.strip()):
-            lines = paragraph.split('\n')
-            list_items = []
-            for line in lines:
-                if line.strip():
-                    # Check if it's a numbered item
-                    if re.match(r'^\d+\.', line.strip()):
-                        list_items.append(f'<div class="mb-2"><strong class="text-success">{line.strip()}</strong></div>')
-                    else:
-                        # It's a continuation of the previous item
-                        if list_items:
-                            list_items[-1] = list_items[-1].replace('</div>', f' {line.strip()}</div>')
-                        else:
-                            list_items.append(f'<div class="mb-2">{line.strip()}</div>')
-            formatted_paragraphs.append('<div class="mb-3">' + ''.join(list_items) + '</div>')
-        
-        # Handle bullet points
-        elif re.search(r'^[*•-]', paragraph.strip()):
-            lines = paragraph.split('\n')
-            list_items = []
-            for line in lines:
-                if line.strip():
-                    if re.match(r'^[*•-]', line.strip()):
-                        clean_line = re.sub(r'^[*•-]\s*', '', line.strip())
-                        list_items.append(f'<div class="mb-2"><span class="text-success me-2">•</span>{clean_line}</div>')
-                    else:
-                        if list_items:
-                            list_items[-1] = list_items[-1].replace('</div>', f' {line.strip()}</div>')
-                        else:
-                            list_items.append(f'<div class="mb-2">{line.strip()}</div>')
-            formatted_paragraphs.append('<div class="mb-3">' + ''.join(list_items) + '</div>')
-        
-        # Regular paragraphs
-        else:
-            # Handle line breaks within paragraphs
-            lines = paragraph.split('\n')
-            paragraph_content = '<br>'.join([line.strip() for line in lines if line.strip()])
-            if paragraph_content:
-                formatted_paragraphs.append(f'<div class="mb-3">{paragraph_content}</div>')
-    
-    # Join all formatted paragraphs
-    result = ''.join(formatted_paragraphs)
-    
-    # If no formatting was applied, wrap in a simple div
-    if not result:
-        result = f'<div class="mb-3">{formatted}</div>'
-    
-    return result
+    formatter = ResponseFormatter()
+    return formatter.feed(text) + formatter.finish()
+
+IMAGE_PROMPT = (
+    "Analyze this plant image for signs of disease, pests, or health issues. Provide detailed observations "
+    "about leaf color, texture, spots, or other abnormalities. Also suggest possible causes and treatments "
+    "if any issues are detected."
+)
 
-def analyze_plant_image_with_ai(image_path):
-    """Analyze plant image using Gemini Vision"""
+# The last line of an analysis asked to pick one of the model's classes
+DIAGNOSIS_PATTERN = re.compile(r'^\W*Diagnosis\W*:\s*(.+?)\s*\|\s*Confidence\W*:\s*(\d{1,3})\s*%?\W*$',
+                               re.IGNORECASE | re.MULTILINE)
+
+def parse_diagnosis(text, classes):
+    """Split an analysis into its prose and its (class, confidence) diagnosis line.
+
+    The diagnosis is None when the line is missing or names no known class.
+    """
+    match = None
+    for match in DIAGNOSIS_PATTERN.finditer(text):
+        pass
+    if match is None:
+        return text, None
+    prose = (text[:match.start()] + text[match.end():]).strip()
+    canonical = {name.lower(): name for name in classes}
+    disease = canonical.get(match.group(1).strip(' *_"\'').lower())
+    if disease is None:
+        return prose, None
+    return prose, (disease, min(int(match.group(2)), 100) / 100)
+
+def analyze_plant_image_with_ai(image_path, classes=None):
+    """Analyze plant image using Gemini Vision.
+
+    With ``classes``, the model also ends its answer with a diagnosis line
+    naming one of them (see parse_diagnosis).
+    """
+    prompt = IMAGE_PROMPT
+    if classes:
+        prompt += (
+            " Finish with one line of the form 'Diagnosis: <name> | Confidence: <0-100>', where <name> is "
+            "exactly one of: " + ', '.join(classes) + ", or Unknown."
+        )
     try:
         with open(image_path, "rb") as f:
             image_bytes = f.read()
-            
+        
+        started = time.perf_counter()
+        image = prepared_images.prepare(image_bytes)
+        prepared = time.perf_counter()
+        
         response = client.models.generate_content(
             model="gemini-2.5-pro",
             contents=[
                 types.Part.from_bytes(
-                    data=image_bytes,
-                    mime_type="image/jpeg",
+                    data=image.data,
+                    mime_type=image.mime_type,
                 ),
-                "Analyze this plant image for signs of disease, pests, or health issues. Provide detailed observations about leaf color, texture, spots, or other abnormalities. Also suggest possible causes and treatments if any issues are detected."
+                prompt
             ],
         )
+        logging.info(
+            f"Analyzed {image.source_format} image ({len(image.data)} bytes, {image.bytes_saved} saved): "
+            f"prepare {(prepared - started) * 1000:.1f} ms, model {(time.perf_counter() - prepared) * 1000:.0f} ms"
+        )
         
-        return response.text if response.text else "Unable to analyze the image."
+        return response.text if response.text else IMAGE_EMPTY_RESPONSE
         
     except Exception as e:
         logging.error(f"Error analyzing image with AI: {e}")
-        return "Error analyzing image. Please try again."
+        return IMAGE_ERROR_RESPONSE
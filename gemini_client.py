@@ -0,0 +1,267 @@
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from types import SimpleNamespace
+
+class GeminiUnavailableError(Exception):
+    """Raised when a Gemini call is refused, times out or the circuit is open"""
+
+class FakeStreamingClient:
+    """Offline stand-in for genai.Client that replays a canned reply.
+
+    Exposes the ``models.generate_content`` and
+    ``models.generate_content_stream`` calls used here, splitting the reply
+    into ``chunk_size`` character chunks with an optional delay between them.
+    ``latency`` (seconds, or a dict keyed by model name) delays blocking
+    calls and ``error`` is raised from every call, to exercise timeouts and
+    the circuit breaker.
+    """
+
+    DEFAULT_REPLY = (
+        "**Tomato early blight** is a common fungal disease.\n\n"
+        "1. Remove infected lower leaves\n"
+        "2. Apply a *copper-based* fungicide\n"
+        "3. Mulch to stop soil splashing onto leaves\n\n"
+        "- Water at the base of plants\n"
+        "- Rotate crops every season"
+    )
+
+    def __init__(self, reply=None, chunk_size=24, delay=0.0, latency=0.0, error=None):
+        self.reply = reply or self.DEFAULT_REPLY
+        self.chunk_size = chunk_size
+        self.delay = delay
+        self.latency = latency
+        self.error = error
+        self.calls = []
+        self.models = self
+
+    def generate_content(self, model, contents, config=None):
+        self.calls.append(model)
+        latency = self.latency.get(model, 0.0) if isinstance(self.latency, dict) else self.latency
+        if latency:
+            time.sleep(latency)
+        if self.error is not None:
+            raise self.error
+        return SimpleNamespace(text=self.reply)
+
+    def generate_content_stream(self, model, contents, config=None):
+        self.calls.append(model)
+        if self.error is not None:
+            raise self.error
+        for start in range(0, len(self.reply), self.chunk_size):
+            if self.delay:
+                time.sleep(self.delay)
+            yield SimpleNamespace(text=self.reply[start:start + self.chunk_size])
+
+class CircuitBreaker:
+    """Consecutive-failure circuit breaker.
+
+    After ``failure_threshold`` failures in a row the circuit opens and calls
+    are refused for ``reset_timeout`` seconds; then a single trial call is
+    let through and its outcome closes or re-opens the circuit.
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at = None
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        with self._lock:
+            if self._opened_at is None:
+                return 'closed'
+            if time.monotonic() - self._opened_at < self.reset_timeout:
+                return 'open'
+            return 'half_open'
+
+    def allow(self):
+        """Return whether a call may go upstream now"""
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if time.monotonic() - self._opened_at < self.reset_timeout or self._trial_running:
+                return False
+            self._trial_running = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_running = False
+
+    def release_trial(self):
+        """Give up a trial call that never reached the upstream"""
+        with self._lock:
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._trial_running or self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+            self._trial_running = False
+
+class ResilientClient:
+    """Guarded wrapper around a Gemini transport (genai.Client or a fake).
+
+    At most ``max_concurrency`` calls are in flight; callers wait up to
+    ``queue_timeout`` seconds for a slot and are refused after that. Blocking
+    calls are abandoned after ``timeout`` seconds. A circuit breaker refuses
+    calls while the upstream keeps failing. For models listed in
+    ``fallbacks``, a blocking call still running after ``hedge_after``
+    seconds is hedged with the same request to the fallback model and the
+    first answer wins.
+
+    Exposes ``models.generate_content`` and ``models.generate_content_stream``
+    so it can stand in for the transport; failures raise
+    ``GeminiUnavailableError``.
+    """
+
+    def __init__(self, transport, max_concurrency=8, timeout=60.0, queue_timeout=5.0,
+                 failure_threshold=5, reset_timeout=30.0, fallbacks=None, hedge_after=None):
+        self.transport = transport
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self.queue_timeout = queue_timeout
+        self.fallbacks = fallbacks or {}
+        self.hedge_after = hedge_after
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+        self.models = self
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix='gemini')
+        self._lock = threading.Lock()
+        self._stats = {
+            'calls': 0,
+            'failures': 0,
+            'timeouts': 0,
+            'rejected': 0,
+            'short_circuited': 0,
+            'hedged': 0,
+            'fallback_wins': 0,
+            'total_latency_ms': 0.0,
+        }
+
+    def available(self):
+        """Whether the circuit currently lets calls through"""
+        return self.breaker.state != 'open'
+
+    def generate_content(self, model, contents, config=None, timeout=None):
+        """Blocking call with concurrency cap, deadline, breaker and hedging"""
+        self._admit()
+        started = time.perf_counter()
+        deadline = started + (timeout or self.timeout)
+
+        self._acquire(deadline)
+        attempts = {self._executor.submit(self._call, model, contents, config): model}
+        fallback = self.fallbacks.get(model)
+        pending = set(attempts)
+        error = None
+        while pending:
+            wait_for = deadline - time.perf_counter()
+            hedging = fallback is not None and self.hedge_after and len(attempts) == 1
+            if hedging:
+                wait_for = min(wait_for, started + self.hedge_after - time.perf_counter())
+            done, pending = wait(pending, timeout=max(wait_for, 0), return_when=FIRST_COMPLETED)
+
+            for future in done:
+                try:
+                    response = future.result()
+                except Exception as e:
+                    error = e
+                    continue
+                self._record(started, success=True, fallback_won=attempts[future] != model)
+                return response
+
+            if done:
+                continue
+            if time.perf_counter() >= deadline:
+                break
+            if hedging and self._slots.acquire(blocking=False):
+                # The primary model is missing its latency target; race the fallback
+                future = self._executor.submit(self._call, fallback, contents, config)
+                attempts[future] = fallback
+                pending.add(future)
+                with self._lock:
+                    self._stats['hedged'] += 1
+            elif hedging:
+                # No free slot to hedge with; just wait for the primary
+                fallback = None
+
+        self._record(started, success=False, timed_out=error is None)
+        if error is not None:
+            raise GeminiUnavailableError(f"Gemini call to {model} failed: {error}") from error
+        raise GeminiUnavailableError(f"Gemini call to {model} timed out")
+
+    def generate_content_stream(self, model, contents, config=None):
+        """Streaming call holding a concurrency slot until the stream ends"""
+        self._admit()
+        started = time.perf_counter()
+        self._acquire(started + self.queue_timeout)
+        finished = False
+        try:
+            for chunk in self.transport.models.generate_content_stream(
+                model=model, contents=contents, config=config
+            ):
+                yield chunk
+            finished = True
+        except Exception as e:
+            finished = True
+            self._record(started, success=False)
+            raise GeminiUnavailableError(f"Gemini stream from {model} failed: {e}") from e
+        finally:
+            self._slots.release()
+            if not finished:
+                # The reader went away mid-stream
+                self.breaker.release_trial()
+        self._record(started, success=True)
+
+    def get_metrics(self):
+        """Return call counters, breaker state and average latency"""
+        with self._lock:
+            stats = dict(self._stats)
+        stats['circuit'] = self.breaker.state
+        stats['max_concurrency'] = self.max_concurrency
+        stats['avg_latency_ms'] = stats['total_latency_ms'] / stats['calls'] if stats['calls'] else 0.0
+        return stats
+
+    def _admit(self):
+        if not self.breaker.allow():
+            with self._lock:
+                self._stats['short_circuited'] += 1
+            raise GeminiUnavailableError("Gemini circuit is open")
+
+    def _acquire(self, deadline):
+        if not self._slots.acquire(timeout=max(min(self.queue_timeout, deadline - time.perf_counter()), 0)):
+            # Overload is not an upstream failure
+            self.breaker.release_trial()
+            with self._lock:
+                self._stats['rejected'] += 1
+            raise GeminiUnavailableError("Too many concurrent Gemini calls")
+
+    def _call(self, model, contents, config):
+        try:
+            return self.transport.models.generate_content(model=model, contents=contents, config=config)
+        finally:
+            self._slots.release()
+
+    def _record(self, started, success, timed_out=False, fallback_won=False):
+        if success:
+            self.breaker.record_success()
+        else:
+            self.breaker.record_failure()
+            logging.warning("Gemini call failed" + (" (timed out)" if timed_out else ""))
+        with self._lock:
+            self._stats['calls'] += 1
+            self._stats['total_latency_ms'] += (time.perf_counter() - started) * 1000
+            if not success:
+                self._stats['failures'] += 1
+            if timed_out:
+                self._stats['timeouts'] += 1
+            if fallback_won:
+                self._stats['fallback_wins'] += 1
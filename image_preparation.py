@@ -0,0 +1,126 @@
+import io
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from PIL import Image, ImageOps
+
+from detection_cache import content_hash
+
+# Image formats Gemini accepts as-is, by PIL format name
+SUPPORTED_MIME_TYPES = {
+    'JPEG': 'image/jpeg',
+    'PNG': 'image/png',
+    'WEBP': 'image/webp',
+}
+
+class PreparedImage:
+    """Image bytes ready to send to Gemini Vision"""
+
+    __slots__ = ('data', 'mime_type', 'original_bytes', 'source_format', 'size')
+
+    def __init__(self, data, mime_type, original_bytes, source_format, size):
+        self.data = data
+        self.mime_type = mime_type
+        self.original_bytes = original_bytes
+        self.source_format = source_format
+        self.size = size
+
+    @property
+    def bytes_saved(self):
+        return self.original_bytes - len(self.data)
+
+def prepare_image(data, max_edge=1536, quality=85):
+    """Downscale and re-encode an upload for Gemini Vision.
+
+    The real format is read from the image header rather than the file
+    name. Images larger than ``max_edge`` on their long side are shrunk and
+    re-encoded as JPEG at ``quality``; so are formats Gemini does not accept
+    (GIF, BMP, TIFF). A small image in a supported format is sent unchanged
+    unless re-encoding makes it smaller.
+    """
+    image = Image.open(io.BytesIO(data))
+    source_format = image.format
+    original_size = image.size
+
+    if image.format == 'JPEG':
+        # Let the JPEG decoder downscale by 1/2, 1/4 or 1/8 while decoding
+        image.draft('RGB', (max_edge, max_edge))
+    image = ImageOps.exif_transpose(image)
+    if image.mode in ('RGBA', 'LA', 'P'):
+        # Flatten transparency onto white rather than black
+        image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, (255, 255, 255))
+        background.paste(image, mask=image.getchannel('A'))
+        image = background
+    elif image.mode != 'RGB':
+        image = image.convert('RGB')
+    image.thumbnail((max_edge, max_edge), Image.Resampling.LANCZOS)
+
+    buffer = io.BytesIO()
+    image.save(buffer, 'JPEG', quality=quality)
+    encoded = buffer.getvalue()
+
+    passthrough = (
+        source_format in SUPPORTED_MIME_TYPES
+        and max(original_size) <= max_edge
+        and len(data) <= len(encoded)
+    )
+    if passthrough:
+        return PreparedImage(data, SUPPORTED_MIME_TYPES[source_format], len(data), source_format, original_size)
+    return PreparedImage(encoded, 'image/jpeg', len(data), source_format, image.size)
+
+class PreparedImageCache:
+    """LRU of prepared images keyed by the SHA-256 of the original bytes"""
+
+    def __init__(self, max_entries=64, max_edge=1536, quality=85):
+        self.max_entries = max_entries
+        self.max_edge = max_edge
+        self.quality = quality
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {
+            'hits': 0,
+            'misses': 0,
+            'bytes_in': 0,
+            'bytes_out': 0,
+            'total_prepare_ms': 0.0,
+        }
+
+    def prepare(self, data):
+        """Return the PreparedImage for these bytes, preparing it if needed"""
+        digest = content_hash(data)
+        with self._lock:
+            prepared = self._entries.get(digest)
+            if prepared is not None:
+                self._entries.move_to_end(digest)
+                self._stats['hits'] += 1
+                return prepared
+
+        started = time.perf_counter()
+        prepared = prepare_image(data, self.max_edge, self.quality)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        logging.info(
+            f"Prepared {prepared.source_format} image for Gemini: {prepared.original_bytes} -> "
+            f"{len(prepared.data)} bytes ({prepared.bytes_saved} saved) in {elapsed_ms:.1f} ms"
+        )
+
+        with self._lock:
+            self._stats['misses'] += 1
+            self._stats['bytes_in'] += prepared.original_bytes
+            self._stats['bytes_out'] += len(prepared.data)
+            self._stats['total_prepare_ms'] += elapsed_ms
+            self._entries[digest] = prepared
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return prepared
+
+    def get_metrics(self):
+        """Return hit counts, bytes saved and average preparation time"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['entries'] = len(self._entries)
+        stats['bytes_saved'] = stats['bytes_in'] - stats['bytes_out']
+        stats['avg_prepare_ms'] = stats['total_prepare_ms'] / stats['misses'] if stats['misses'] else 0.0
+        return stats
@@ -0,0 +1,131 @@
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import numpy as np
+
+from plant_disease_model import build_prediction, input_shape
+
+class InferenceBatcher:
+    """Micro-batching scheduler that groups concurrent predictions.
+
+    Request threads submit preprocessed image arrays; a single worker thread
+    collects them for up to ``max_wait_ms`` or ``max_batch_size`` images,
+    runs one batched forward pass and resolves each caller's future with its
+    own prediction dict.
+    """
+
+    def __init__(self, model, max_batch_size=8, max_wait_ms=10, max_queue_depth=64):
+        self.model = model
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self._queue = queue.Queue(maxsize=max_queue_depth)
+        # Reused for every batch so the worker never allocates input tensors
+        self._buffer = np.empty((max_batch_size, *input_shape(model.data_format)), dtype=np.float32)
+        self._lock = threading.Lock()
+        self._stats = {
+            'batches': 0,
+            'images': 0,
+            'rejected': 0,
+            'errors': 0,
+            'total_queue_wait_ms': 0.0,
+            'max_queue_wait_ms': 0.0,
+            'total_inference_ms': 0.0,
+        }
+        self._thread = threading.Thread(target=self._run, name='inference-batcher', daemon=True)
+        self._thread.start()
+
+    def submit(self, image_array):
+        """Queue an image for prediction and return a Future for its result.
+
+        Raises ``queue.Full`` when the queue is at its configured depth.
+        """
+        future = Future()
+        try:
+            self._queue.put_nowait((image_array, future, time.perf_counter()))
+        except queue.Full:
+            with self._lock:
+                self._stats['rejected'] += 1
+            raise
+        return future
+
+    def predict(self, image_array, timeout=None):
+        """Submit an image and block until its prediction is available"""
+        return self.submit(image_array).result(timeout)
+
+    def close(self):
+        """Stop the worker thread after the queued work has drained"""
+        self._queue.put(None)
+        self._thread.join()
+
+    def get_metrics(self):
+        """Return batch fill and queue wait statistics"""
+        with self._lock:
+            stats = dict(self._stats)
+        batches = stats['batches'] or 1
+        images = stats['images'] or 1
+        stats.update({
+            'max_batch_size': self.max_batch_size,
+            'max_wait_ms': self.max_wait * 1000,
+            'queue_depth': self._queue.qsize(),
+            'avg_batch_size': stats['images'] / batches,
+            'avg_batch_fill': stats['images'] / (batches * self.max_batch_size),
+            'avg_queue_wait_ms': stats['total_queue_wait_ms'] / images,
+            'avg_inference_ms': stats['total_inference_ms'] / batches,
+        })
+        return stats
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+
+            batch = [item]
+            deadline = item[2] + self.max_wait
+            stop = False
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is None:
+                    stop = True
+                    break
+                batch.append(item)
+
+            self._process(batch)
+            if stop:
+                return
+
+    def _process(self, batch):
+        started = time.perf_counter()
+        size = len(batch)
+        try:
+            for i, (image_array, _, _) in enumerate(batch):
+                self._buffer[i] = image_array
+            probabilities = self.model.predict(self._buffer[:size])
+        except Exception as e:
+            logging.error(f"Error during batched prediction: {e}")
+            with self._lock:
+                self._stats['errors'] += size
+            for _, future, _ in batch:
+                future.set_exception(e)
+            return
+
+        finished = time.perf_counter()
+        waits = [(started - enqueued) * 1000 for _, _, enqueued in batch]
+        with self._lock:
+            self._stats['batches'] += 1
+            self._stats['images'] += size
+            self._stats['total_queue_wait_ms'] += sum(waits)
+            self._stats['max_queue_wait_ms'] = max(self._stats['max_queue_wait_ms'], max(waits))
+            self._stats['total_inference_ms'] += (finished - started) * 1000
+
+        for (_, future, _), scores in zip(batch, probabilities):
+            future.set_result(build_prediction(scores))
@@ -0,0 +1,72 @@
+import logging
+from datetime import datetime
+
+from sqlalchemy import inspect, text
+from sqlalchemy.exc import IntegrityError
+
+def add_column(table, column, definition):
+    """Migration step that adds a column unless the table already has it"""
+    def step(connection):
+        if column not in {info['name'] for info in inspect(connection).get_columns(table)}:
+            connection.execute(text(f'ALTER TABLE {table} ADD COLUMN {column} {definition}'))
+    return step
+
+# Schema changes for databases created before the models declared them.
+# db.create_all() builds new tables at the latest schema, so every statement
+# here must be safe to run against a table that already matches it.
+# Append new migrations with the next version number; never edit old ones.
+# A step is either an SQL string or a callable taking the connection.
+MIGRATIONS = [
+    (1, 'Per-user time-ordered history indexes', [
+        'CREATE INDEX IF NOT EXISTS ix_detection_user_detected_at ON detection (user_id, detected_at DESC)',
+        'CREATE INDEX IF NOT EXISTS ix_detection_disease_name ON detection (disease_name)',
+        'CREATE INDEX IF NOT EXISTS ix_weather_query_user_queried_at ON weather_query (user_id, queried_at DESC)',
+        'CREATE INDEX IF NOT EXISTS ix_chat_history_user_created_at ON chat_history (user_id, created_at DESC)',
+        'CREATE INDEX IF NOT EXISTS ix_crop_care_query_user_queried_at ON crop_care_query (user_id, queried_at DESC)',
+        'CREATE INDEX IF NOT EXISTS ix_detection_job_user_created_at ON detection_job (user_id, created_at DESC)',
+    ]),
+    (2, 'Mark chat answers given without conversation context', [
+        add_column('chat_history', 'cacheable', 'BOOLEAN NOT NULL DEFAULT FALSE'),
+    ]),
+    (3, 'Share detection reviews by image and record their diagnosis', [
+        add_column('detection_review', 'content_hash', 'VARCHAR(64)'),
+        add_column('detection_review', 'disease_name', 'VARCHAR(200)'),
+        add_column('detection_review', 'confidence', 'FLOAT'),
+        add_column('detection_review', 'local_disease_name', 'VARCHAR(200)'),
+        add_column('detection_review', 'local_confidence', 'FLOAT'),
+        'CREATE INDEX IF NOT EXISTS ix_detection_review_content_hash ON detection_review (content_hash)',
+    ]),
+]
+
+def applied_versions(connection):
+    """Return the set of migration versions recorded in the database"""
+    connection.execute(text(
+        'CREATE TABLE IF NOT EXISTS schema_migrations ('
+        'version INTEGER PRIMARY KEY, description VARCHAR(200) NOT NULL, applied_at TIMESTAMP NOT NULL)'
+    ))
+    return {version for (version,) in connection.execute(text('SELECT version FROM schema_migrations'))}
+
+def migrate(engine):
+    """Apply pending migrations in order, each in its own transaction"""
+    with engine.begin() as connection:
+        applied = applied_versions(connection)
+
+    for version, description, statements in MIGRATIONS:
+        if version in applied:
+            continue
+        try:
+            with engine.begin() as connection:
+                for statement in statements:
+                    if callable(statement):
+                        statement(connection)
+                    else:
+                        connection.execute(text(statement))
+                connection.execute(
+                    text('INSERT INTO schema_migrations (version, description, applied_at) '
+                         'VALUES (:version, :description, :applied_at)'),
+                    {'version': version, 'description': description, 'applied_at': datetime.utcnow()}
+                )
+        except IntegrityError:
+            # Another process applied it concurrently
+            continue
+        logging.info(f"Applied schema migration {version}: {description}")
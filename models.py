@@ -25,22 +25,90 @@ class Detection(db.Model):
     treatment = db.Column(db.Text)
     image_path = db.Column(db.String(200))
     detected_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (
+        db.Index('ix_detection_user_detected_at', user_id, detected_at.desc()),
+        db.Index('ix_detection_disease_name', disease_name),
+    )
 
 class WeatherQuery(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     location = db.Column(db.String(100), nullable=False)
     queried_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (
+        db.Index('ix_weather_query_user_queried_at', user_id, queried_at.desc()),
+    )
 
 class ChatHistory(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     user_message = db.Column(db.Text, nullable=False)
     ai_response = db.Column(db.Text, nullable=False)
+    # Answered without the user's conversation context, so safe to share
+    cacheable = db.Column(db.Boolean, nullable=False, default=False, server_default=db.false())
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (
+        db.Index('ix_chat_history_user_created_at', user_id, created_at.desc()),
+    )
 
 class CropCareQuery(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     crop_type = db.Column(db.String(100), nullable=False)
     queried_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (
+        db.Index('ix_crop_care_query_user_queried_at', user_id, queried_at.desc()),
+    )
+
+class DetectionJob(db.Model):
+    id = db.Column(db.String(32), primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='queued')  # queued, running, done, failed
+    image_path = db.Column(db.String(200), nullable=False)
+    result = db.Column(db.Text)  # JSON-encoded prediction
+    error = db.Column(db.Text)
+    detection_id = db.Column(db.Integer, db.ForeignKey('detection.id'))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (
+        db.Index('ix_detection_job_user_created_at', user_id, created_at.desc()),
+    )
+
+class ConversationSummary(db.Model):
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    summary = db.Column(db.Text, nullable=False, default='')
+    covered_until = db.Column(db.Integer, nullable=False, default=0)  # last ChatHistory.id folded into the summary
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class DetectionReview(db.Model):
+    detection_id = db.Column(db.Integer, db.ForeignKey('detection.id'), primary_key=True)
+    content_hash = db.Column(db.String(64))  # of the image, so repeat uploads share one review
+    status = db.Column(db.String(20), nullable=False, default='pending')  # pending, done, failed
+    analysis = db.Column(db.Text)  # Gemini Vision's answer for a low-confidence detection
+    # Gemini's diagnosis, when it named one of the model's classes, and the
+    # local prediction it replaced on the Detection
+    disease_name = db.Column(db.String(200))
+    confidence = db.Column(db.Float)
+    local_disease_name = db.Column(db.String(200))
+    local_confidence = db.Column(db.Float)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    detection = db.relationship('Detection', backref=db.backref('review', uselist=False))
+    
+    __table_args__ = (
+        db.Index('ix_detection_review_content_hash', content_hash),
+    )
+
+class UserStats(db.Model):
+    # Activity counters kept in step with inserts (see user_stats.py)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    detections = db.Column(db.Integer, nullable=False, default=0)
+    weather_queries = db.Column(db.Integer, nullable=False, default=0)
+    chat_messages = db.Column(db.Integer, nullable=False, default=0)
+    crop_care_queries = db.Column(db.Integer, nullable=False, default=0)
@@ -0,0 +1,155 @@
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+
+class RenderedPage:
+    """A rendered page body with its validators"""
+
+    __slots__ = ('body', 'etag', 'last_modified')
+
+    def __init__(self, body, etag, last_modified):
+        self.body = body
+        self.etag = etag
+        self.last_modified = last_modified
+
+class RenderedPageCache:
+    """LRU of rendered pages for content that only changes with its data.
+
+    Callers key each page by template, arguments, data version and viewer,
+    so a new version of the data simply misses. The ETag is a hash of the
+    body, so re-rendering unchanged content keeps the client's copy valid.
+    """
+
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {
+            'hits': 0,
+            'misses': 0,
+        }
+
+    def get_or_render(self, key, render, last_modified):
+        """Return the cached RenderedPage for ``key``, calling ``render()`` on a miss"""
+        with self._lock:
+            page = self._entries.get(key)
+            if page is not None:
+                self._entries.move_to_end(key)
+                self._stats['hits'] += 1
+                return page
+
+        body = render().encode('utf-8')
+        page = RenderedPage(body, hashlib.sha256(body).hexdigest()[:32], last_modified)
+        with self._lock:
+            self._stats['misses'] += 1
+            self._entries[key] = page
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return page
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def get_metrics(self):
+        """Return hit counts and cache size"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['entries'] = len(self._entries)
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = stats['hits'] / lookups if lookups else 0.0
+        return stats
+
+class StaticFingerprints:
+    """Content hashes of static assets, refreshed when a file's mtime changes.
+
+    Only files under ``folders`` (the site's own css, js and images) are
+    fingerprinted; user uploads and anything else get no version, so they
+    are never hashed or given far-future caching. At most ``max_entries``
+    hashes are kept, least recently used first out.
+
+    ``generation`` moves whenever a hashed file's contents change, so pages
+    rendered with the old ``?v=`` URLs can be keyed out of a cache. The
+    hashed files are re-checked at most every ``check_interval`` seconds.
+    """
+
+    def __init__(self, static_folder, folders=('css', 'js', 'img'), max_entries=256, check_interval=2.0):
+        self.static_folder = static_folder
+        self.folders = tuple(folder.rstrip('/') + '/' for folder in folders)
+        self.max_entries = max_entries
+        self.check_interval = check_interval
+        self.modified_at = None
+        self._generation = 0
+        self._checked = time.monotonic()
+        self._hashes = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, filename):
+        """Return a short hash of the file's contents, or None if it is not a fingerprinted asset"""
+        if not filename.startswith(self.folders) or '..' in filename.split('/'):
+            return None
+        path = os.path.join(self.static_folder, filename)
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except OSError:
+            return None
+        with self._lock:
+            cached = self._hashes.get(filename)
+            if cached is not None and cached[0] == mtime:
+                self._hashes.move_to_end(filename)
+                return cached[1]
+
+        with open(path, 'rb') as f:
+            digest = hashlib.sha256(f.read()).hexdigest()[:12]
+        with self._lock:
+            previous = self._hashes.get(filename)
+            if previous is not None and previous[1] != digest:
+                self._changed(mtime)
+            self._hashes[filename] = (mtime, digest)
+            self._hashes.move_to_end(filename)
+            while len(self._hashes) > self.max_entries:
+                self._hashes.popitem(last=False)
+        return digest
+
+    def generation(self):
+        """Return a counter that moves whenever a fingerprinted file changes"""
+        now = time.monotonic()
+        with self._lock:
+            if now - self._checked < self.check_interval:
+                return self._generation
+            self._checked = now
+            hashed = [(filename, cached[0]) for filename, cached in self._hashes.items()]
+
+        for filename, mtime in hashed:
+            try:
+                current = os.stat(os.path.join(self.static_folder, filename)).st_mtime_ns
+            except OSError:
+                with self._lock:
+                    if self._hashes.pop(filename, None) is not None:
+                        self._changed(time.time_ns())
+                continue
+            if current != mtime:
+                # Rehashes the file and moves the generation if its contents differ
+                self.get(filename)
+        with self._lock:
+            return self._generation
+
+    def _changed(self, mtime_ns):
+        # Called with the lock held
+        self._generation += 1
+        changed_at = datetime.fromtimestamp(mtime_ns // 10 ** 9, timezone.utc)
+        self.modified_at = max(self.modified_at, changed_at) if self.modified_at else changed_at
+
+def latest_mtime(folder):
+    """Latest modification time of any file under ``folder``, as an aware datetime"""
+    latest = 0
+    for root, _, names in os.walk(folder):
+        for name in names:
+            try:
+                latest = max(latest, os.stat(os.path.join(root, name)).st_mtime)
+            except OSError:
+                continue
+    return datetime.fromtimestamp(int(latest), timezone.utc)
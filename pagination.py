@@ -0,0 +1,37 @@
+import base64
+from datetime import datetime
+
+from sqlalchemy import tuple_
+
+def encode_cursor(timestamp, row_id):
+    """Opaque cursor pointing just past a row in (timestamp, id) order"""
+    raw = f"{timestamp.isoformat()}|{row_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+def decode_cursor(cursor):
+    """Return (timestamp, id) from a cursor; raises ValueError if malformed"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        timestamp, row_id = raw.split('|')
+        return datetime.fromisoformat(timestamp), int(row_id)
+    except (UnicodeDecodeError, ValueError, TypeError) as e:
+        raise ValueError('Invalid cursor') from e
+
+def keyset_page(query, time_column, id_column, cursor=None, limit=20):
+    """Fetch one page of ``query`` newest first, continuing after ``cursor``.
+
+    Seeks on (time, id) instead of using OFFSET, so with an index on
+    (user_id, time DESC) every page costs the same however far back it is.
+    Returns (rows, next_cursor); next_cursor is None on the last page.
+    """
+    if cursor:
+        timestamp, row_id = decode_cursor(cursor)
+        query = query.filter(tuple_(time_column, id_column) < tuple_(timestamp, row_id))
+    rows = query.order_by(time_column.desc(), id_column.desc()).limit(limit + 1).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor(getattr(last, time_column.key), getattr(last, id_column.key))
+    return rows, next_cursor
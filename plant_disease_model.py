@@ -1,8 +1,29 @@
-import random
 from PIL import Image
+import numpy as np
 import os
 import logging
 
+# Input size expected by the classifier (height, width)
+IMAGE_SIZE = (224, 224)
+
+# Tensor layout fed to the model: 'channels_last' (N, H, W, C) or 'channels_first' (N, C, H, W)
+DATA_FORMAT = os.environ.get("MODEL_DATA_FORMAT", "channels_last")
+
+# Resampling filters available for resizing uploads to IMAGE_SIZE
+RESIZE_FILTERS = {
+    'nearest': Image.Resampling.NEAREST,
+    'box': Image.Resampling.BOX,
+    'bilinear': Image.Resampling.BILINEAR,
+    'hamming': Image.Resampling.HAMMING,
+    'bicubic': Image.Resampling.BICUBIC,
+    'lanczos': Image.Resampling.LANCZOS,
+}
+RESIZE_FILTER = os.environ.get("RESIZE_FILTER", "bilinear")
+
+# Path to trained weights: a Keras file (.keras/.h5), a SavedModel directory,
+# or a NumPy weights archive (.npz). Falls back to demo weights when unset.
+MODEL_PATH = os.environ.get("MODEL_PATH", "")
+
 # Disease classes that the model can detect
 DISEASE_CLASSES = [
     'Healthy',
@@ -156,36 +177,162 @@ TREATMENT_RECOMMENDATIONS = {
     }
 }
 
+def softmax(logits):
+    """Numerically stable softmax over the last axis"""
+    shifted = logits - np.max(logits, axis=-1, keepdims=True)
+    exp = np.exp(shifted)
+    return exp / np.sum(exp, axis=-1, keepdims=True)
+
+def model_version(path):
+    """Identify a weights file by name and modification time"""
+    return f"{os.path.basename(os.path.normpath(path))}@{int(os.path.getmtime(path))}"
+
+def input_shape(data_format=None):
+    """Return the per-image tensor shape for the given layout"""
+    if (data_format or DATA_FORMAT) == 'channels_first':
+        return (3, IMAGE_SIZE[0], IMAGE_SIZE[1])
+    return (IMAGE_SIZE[0], IMAGE_SIZE[1], 3)
+
+class NumpyClassifier:
+    """Dense classifier evaluated with NumPy from a weights archive.
+
+    The archive holds ``dense_<i>_kernel``/``dense_<i>_bias`` arrays applied
+    in order with ReLU between layers, plus an optional ``pool`` factor used
+    to average-pool the input image before flattening.
+    """
+
+    model_type = 'numpy'
+
+    def __init__(self, layers, pool=1, version='numpy', data_format=None):
+        self.layers = layers
+        self.pool = pool
+        self.version = version
+        self.data_format = data_format or DATA_FORMAT
+        for kernel, bias in self.layers:
+            kernel.flags.writeable = False
+            bias.flags.writeable = False
+
+    @classmethod
+    def from_archive(cls, path):
+        with np.load(path) as archive:
+            layers = []
+            i = 0
+            while f'dense_{i}_kernel' in archive:
+                layers.append((
+                    np.asarray(archive[f'dense_{i}_kernel'], dtype=np.float32),
+                    np.asarray(archive[f'dense_{i}_bias'], dtype=np.float32),
+                ))
+                i += 1
+            pool = int(archive['pool']) if 'pool' in archive else 1
+        if not layers:
+            raise ValueError(f"No dense layers found in {path}")
+        return cls(layers, pool=pool, version=model_version(path))
+
+    def predict(self, batch):
+        """Return class probabilities for a float32 batch in ``data_format`` layout"""
+        x = np.asarray(batch, dtype=np.float32)
+        if self.data_format == 'channels_first':
+            x = x.transpose(0, 2, 3, 1)
+        if self.pool > 1:
+            n, h, w, c = x.shape
+            x = x.reshape(n, h // self.pool, self.pool, w // self.pool, self.pool, c).mean(axis=(2, 4))
+        x = x.reshape(x.shape[0], -1)
+        for i, (kernel, bias) in enumerate(self.layers):
+            x = x @ kernel + bias
+            if i < len(self.layers) - 1:
+                np.maximum(x, 0, out=x)
+        return softmax(x)
+
+class KerasClassifier:
+    """Wrapper around a TensorFlow SavedModel or Keras model file"""
+
+    model_type = 'tensorflow'
+
+    def __init__(self, path, data_format=None):
+        import tensorflow as tf
+
+        self.version = model_version(path)
+        self.data_format = data_format or DATA_FORMAT
+        self.model = tf.keras.models.load_model(path, compile=False)
+        # A fixed input signature means the graph is traced exactly once
+        self._forward = tf.function(
+            lambda x: self.model(x, training=False),
+            input_signature=[tf.TensorSpec([None, *input_shape(self.data_format)], tf.float32)],
+        )
+
+    def predict(self, batch):
+        """Return class probabilities for a float32 batch in ``data_format`` layout"""
+        outputs = self._forward(np.asarray(batch, dtype=np.float32)).numpy()
+        # Models exported without a final softmax layer return logits
+        if np.any(outputs < 0) or not np.allclose(outputs.sum(axis=-1), 1.0, atol=1e-3):
+            outputs = softmax(outputs)
+        return outputs
+
 def create_demo_classifier():
-    """Create a demo classifier for demonstration purposes"""
-    return {
-        'model_type': 'demo_classifier',
-        'classes': DISEASE_CLASSES,
-        'loaded': True
-    }
+    """Create a demo classifier with fixed random weights for demonstration purposes"""
+    rng = np.random.default_rng(0)
+    pool = 16
+    features = (IMAGE_SIZE[0] // pool) * (IMAGE_SIZE[1] // pool) * 3
+    kernel = rng.normal(0, 1, (features, len(DISEASE_CLASSES))).astype(np.float32)
+    bias = np.zeros(len(DISEASE_CLASSES), dtype=np.float32)
+    return NumpyClassifier([(kernel, bias)], pool=pool, version='demo')
 
-def load_model():
-    """Load the plant disease detection model"""
+def load_model(model_path=None):
+    """Load the plant disease detection model and warm it up"""
+    model_path = model_path or MODEL_PATH
     try:
-        # For demo purposes - in production, load actual TensorFlow model
-        model = create_demo_classifier()
-        logging.info("Plant disease model loaded successfully (demo mode)")
+        if not model_path:
+            model = create_demo_classifier()
+        elif model_path.endswith('.npz'):
+            model = NumpyClassifier.from_archive(model_path)
+        else:
+            model = KerasClassifier(model_path)
+
+        # Run one forward pass so the first request does not pay for
+        # weight materialisation or graph tracing
+        warmup = model.predict(np.zeros((1, *input_shape(model.data_format)), dtype=np.float32))
+        if warmup.shape[-1] != len(DISEASE_CLASSES):
+            raise ValueError(
+                f"Model outputs {warmup.shape[-1]} classes, expected {len(DISEASE_CLASSES)}"
+            )
+
+        logging.info(f"Plant disease model loaded successfully ({model.model_type}, {model.version})")
         return model
     except Exception as e:
         logging.error(f"Error loading model: {e}")
         return None
 
-def preprocess_image(image):
-    """Preprocess the uploaded image for prediction"""
+def preprocess_image(image, out=None, resize_filter=None, data_format=None):
+    """Decode, resize and normalize an uploaded image into a float32 tensor.
+
+    JPEG uploads are decoded at reduced scale with ``draft`` so full-size
+    phone photos are never materialised. When ``out`` is given (for example
+    a row of a preallocated batch buffer) the normalized pixels are written
+    into it directly and it is returned.
+    """
     try:
+        data_format = data_format or DATA_FORMAT
+        resample = RESIZE_FILTERS[resize_filter or RESIZE_FILTER]
+
+        # Let the JPEG decoder downscale by 1/2, 1/4 or 1/8 while decoding
+        if image.format == 'JPEG':
+            image.draft('RGB', IMAGE_SIZE)
+
         # Convert to RGB if necessary
         if image.mode != 'RGB':
             image = image.convert('RGB')
-        
-        # Resize image to standard size (224, 224 is common for CNN models)
-        image = image.resize((224, 224))
-        
-        return image
+
+        if image.size != IMAGE_SIZE:
+            image = image.resize(IMAGE_SIZE, resample)
+
+        pixels = np.asarray(image)
+        if data_format == 'channels_first':
+            pixels = pixels.transpose(2, 0, 1)
+
+        if out is None:
+            out = np.empty(input_shape(data_format), dtype=np.float32)
+        np.multiply(pixels, np.float32(1 / 255), out=out)
+        return out
     except Exception as e:
         logging.error(f"Error preprocessing image: {e}")
         return None
@@ -193,64 +340,9 @@ def preprocess_image(image):
 def predict_disease(model, processed_image):
     """Predict plant disease from preprocessed image"""
     try:
-        # For demo purposes - in production, use actual model inference
-        predicted_disease = random.choice(DISEASE_CLASSES)
-        confidence = random.uniform(0.75, 0.95)  # Random confidence between 75-95%
-        
-        # Get treatment recommendations
-        treatment_info = TREATMENT_RECOMMENDATIONS.get(predicted_disease, {
-            'treatment': 'Consult with a local agricultural expert for proper diagnosis and treatment.',
-            'prevention': 'Follow general good agricultural practices for disease prevention.'
-        })
-        
-        # Generate detailed analysis
-        severity_levels = ['Mild', 'Moderate', 'Severe']
-        severity = random.choice(severity_levels)
-        
-        # Extract plant and disease type from disease name
-        if ' ' in predicted_disease:
-            parts = predicted_disease.split(' ', 1)
-            plant_type = parts[0]
-            disease_type = parts[1] if len(parts) > 1 else predicted_disease
-        else:
-            plant_type = 'Unknown'
-            disease_type = predicted_disease
-        
-        # Generate additional details
-        affected_areas = ['Leaves', 'Stems', 'Fruits', 'Roots']
-        primary_affected = random.choice(affected_areas)
-        
-        # Time-sensitive recommendations
-        immediate_actions = [
-            "Remove affected plant parts immediately",
-            "Isolate infected plants from healthy ones", 
-            "Apply appropriate fungicide/treatment",
-            "Improve air circulation around plants",
-            "Adjust watering schedule to prevent moisture buildup"
-        ]
-        
-        long_term_actions = [
-            "Monitor plants daily for symptom progression",
-            "Implement crop rotation in next season",
-            "Improve soil drainage and fertility",
-            "Use disease-resistant varieties in future plantings",
-            "Maintain proper plant spacing for air circulation"
-        ]
-        
-        return {
-            'disease': predicted_disease,
-            'disease_display_name': disease_type.replace('_', ' ').title(),
-            'plant_type': plant_type,
-            'confidence': confidence,
-            'severity': severity,
-            'primary_affected_area': primary_affected,
-            'treatment': treatment_info.get('treatment', ''),
-            'prevention': treatment_info.get('prevention', ''),
-            'immediate_actions': random.sample(immediate_actions, 3),
-            'long_term_actions': random.sample(long_term_actions, 3),
-            'confidence_level': 'High' if confidence > 0.85 else 'Medium' if confidence > 0.75 else 'Moderate',
-            'risk_level': 'High' if severity == 'Severe' else 'Medium' if severity == 'Moderate' else 'Low'
-        }
+        batch = processed_image[np.newaxis]
+        probabilities = model.predict(batch)[0]
+        return build_prediction(probabilities)
     except Exception as e:
         logging.error(f"Error during prediction: {e}")
         return {
@@ -259,3 +351,157 @@ def predict_disease(model, processed_image):
             'treatment': 'Unable to process image. Please try with a different image.',
             'prevention': 'Ensure image is clear and shows plant leaves clearly.'
         }
+
+DEFAULT_RECOMMENDATION = {
+    'treatment': 'Consult with a local agricultural expert for proper diagnosis and treatment.',
+    'prevention': 'Follow general good agricultural practices for disease prevention.'
+}
+
+# First matching keyword in the disease name decides the part of the plant it mostly shows on
+AFFECTED_AREAS = (
+    ('Healthy', 'None'),
+    ('Rot', 'Fruits'),
+    ('Esca', 'Stems'),
+)
+
+# Immediate and long-term actions by kind of disease
+DISEASE_ACTIONS = {
+    'healthy': (
+        ("Continue regular watering and feeding",
+         "Inspect leaves weekly for early symptoms",
+         "Keep the area free of weeds and plant debris"),
+        ("Rotate crops each season",
+         "Maintain proper plant spacing for air circulation",
+         "Keep records of any problems to spot patterns"),
+    ),
+    'fungal': (
+        ("Remove affected plant parts immediately",
+         "Apply appropriate fungicide/treatment",
+         "Adjust watering schedule to prevent moisture buildup"),
+        ("Monitor plants daily for symptom progression",
+         "Implement crop rotation in next season",
+         "Maintain proper plant spacing for air circulation"),
+    ),
+    'bacterial': (
+        ("Remove affected plant parts immediately",
+         "Apply a copper-based bactericide",
+         "Avoid overhead watering and working with wet plants"),
+        ("Disinfect tools between plants",
+         "Implement crop rotation in next season",
+         "Use disease-resistant varieties in future plantings"),
+    ),
+    'viral': (
+        ("Remove and destroy infected plants",
+         "Isolate infected plants from healthy ones",
+         "Control insects that spread the virus, such as aphids and whiteflies"),
+        ("Use certified virus-free seed and transplants",
+         "Disinfect tools and wash hands after handling plants",
+         "Use disease-resistant varieties in future plantings"),
+    ),
+    'pest': (
+        ("Isolate infested plants from healthy ones",
+         "Spray leaves with water or insecticidal soap",
+         "Remove heavily infested leaves"),
+        ("Monitor leaf undersides daily for pests",
+         "Encourage natural predators",
+         "Avoid drought stress, which favours infestations"),
+    ),
+}
+
+def disease_kind(disease_type):
+    """Classify a disease name into one of the DISEASE_ACTIONS kinds"""
+    if disease_type.endswith('Healthy'):
+        return 'healthy'
+    if 'Virus' in disease_type or 'Greening' in disease_type:
+        return 'viral'
+    if 'Bacterial' in disease_type:
+        return 'bacterial'
+    if 'Mites' in disease_type:
+        return 'pest'
+    return 'fungal'
+
+class DiseaseProfile:
+    """The parts of a prediction result fixed by its class"""
+
+    __slots__ = ('disease', 'display_name', 'plant_type', 'healthy', 'treatment', 'prevention',
+                 'primary_affected_area', 'immediate_actions', 'long_term_actions')
+
+    def __init__(self, disease):
+        # Class names lead with the plant, e.g. 'Tomato Late Blight'
+        if ' ' in disease:
+            plant_type, disease_type = disease.split(' ', 1)
+        else:
+            plant_type, disease_type = 'Unknown', disease
+        kind = disease_kind(disease_type)
+        recommendation = TREATMENT_RECOMMENDATIONS.get(disease)
+        if recommendation is None:
+            recommendation = TREATMENT_RECOMMENDATIONS['Healthy'] if kind == 'healthy' else DEFAULT_RECOMMENDATION
+
+        self.disease = disease
+        self.display_name = disease_type.replace('_', ' ').title()
+        self.plant_type = plant_type
+        self.healthy = kind == 'healthy'
+        self.treatment = recommendation.get('treatment', '')
+        self.prevention = recommendation.get('prevention', '')
+        self.primary_affected_area = next(
+            (area for keyword, area in AFFECTED_AREAS if keyword in disease_type), 'Leaves'
+        )
+        self.immediate_actions, self.long_term_actions = DISEASE_ACTIONS[kind]
+
+# Precomputed result fields, indexed like DISEASE_CLASSES and the model output
+DISEASE_PROFILES = tuple(DiseaseProfile(disease) for disease in DISEASE_CLASSES)
+HEALTHY_CLASS_INDICES = np.array([i for i, profile in enumerate(DISEASE_PROFILES) if profile.healthy])
+
+# Number of runner-up classes reported with each prediction
+PREDICTION_ALTERNATIVES = int(os.environ.get("PREDICTION_ALTERNATIVES", 3))
+
+def build_prediction(probabilities):
+    """Build the prediction result from a softmax vector over DISEASE_CLASSES.
+
+    Severity is the probability mass on diseased classes; confidence level
+    also weighs the margin over the runner-up class.
+    """
+    probabilities = np.asarray(probabilities)
+    ranked = np.argsort(probabilities)[::-1][:PREDICTION_ALTERNATIVES + 1].tolist()
+    scores = probabilities.tolist()
+    profile = DISEASE_PROFILES[ranked[0]]
+    confidence = scores[ranked[0]]
+    margin = confidence - scores[ranked[1]] if len(ranked) > 1 else confidence
+
+    if profile.healthy:
+        severity = 'None'
+    else:
+        disease_mass = 1.0 - float(probabilities[HEALTHY_CLASS_INDICES].sum())
+        severity = 'Severe' if disease_mass > 0.9 else 'Moderate' if disease_mass > 0.6 else 'Mild'
+
+    if confidence > 0.85 and margin > 0.5:
+        confidence_level = 'High'
+    elif confidence > 0.75 and margin > 0.25:
+        confidence_level = 'Medium'
+    else:
+        confidence_level = 'Moderate'
+
+    return {
+        'disease': profile.disease,
+        'disease_display_name': profile.display_name,
+        'plant_type': profile.plant_type,
+        'confidence': confidence,
+        'severity': severity,
+        'primary_affected_area': profile.primary_affected_area,
+        'treatment': profile.treatment,
+        'prevention': profile.prevention,
+        'immediate_actions': profile.immediate_actions,
+        'long_term_actions': profile.long_term_actions,
+        'confidence_level': confidence_level,
+        'risk_level': 'High' if severity == 'Severe' else 'Medium' if severity == 'Moderate' else 'Low',
+        'alternatives': [
+            {
+                'disease': DISEASE_PROFILES[i].disease,
+                'disease_display_name': DISEASE_PROFILES[i].display_name,
+                'plant_type': DISEASE_PROFILES[i].plant_type,
+                'confidence': scores[i],
+            }
+            for i in ranked[1:]
+        ],
+        'scores': dict(zip(DISEASE_CLASSES, scores))
+    }
@@ -0,0 +1,178 @@
+import threading
+import time
+from collections import Counter, OrderedDict, defaultdict
+
+from sqlalchemy import event, func, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+
+from models import db, Detection, DetectionJob, WeatherQuery, ChatHistory, CropCareQuery, UserStats
+
+# Activity tables and the UserStats counter each one feeds
+COUNTED_MODELS = {
+    Detection: 'detections',
+    WeatherQuery: 'weather_queries',
+    ChatHistory: 'chat_messages',
+    CropCareQuery: 'crop_care_queries',
+}
+
+# Writes to these tables change what a user's dashboard shows
+DASHBOARD_MODELS = tuple(COUNTED_MODELS) + (DetectionJob,)
+
+STATS_TABLE = UserStats.__table__
+
+# Dialect inserts that can skip a row whose key already exists
+CONFLICT_INSERTS = {
+    'sqlite': sqlite.insert,
+    'postgresql': postgresql.insert,
+}
+
+def insert_if_absent(connection, table, values):
+    """Insert a row unless one with the same key exists; returns the number inserted"""
+    dialect_insert = CONFLICT_INSERTS.get(connection.dialect.name)
+    if dialect_insert is not None:
+        return connection.execute(dialect_insert(table).on_conflict_do_nothing(), values).rowcount
+    try:
+        with connection.begin_nested():
+            return connection.execute(table.insert(), values).rowcount
+    except IntegrityError:
+        return 0
+
+def count_activity(connection, user_id):
+    """Count a user's rows in every activity table with one aggregate query"""
+    row = connection.execute(select(*(
+        select(func.count()).select_from(model).where(model.user_id == user_id).scalar_subquery().label(column)
+        for model, column in COUNTED_MODELS.items()
+    ))).one()
+    return dict(row._mapping)
+
+def increment_stats(connection, user_id, counts):
+    """Add ``counts`` (counter name -> delta) to a user's UserStats row.
+
+    The row is created on first use from the user's existing history, so
+    counters stay correct for data written before they existed.
+    """
+    if counts:
+        updated = connection.execute(
+            STATS_TABLE.update().where(STATS_TABLE.c.user_id == user_id).values(
+                {column: STATS_TABLE.c[column] + delta for column, delta in counts.items()}
+            )
+        ).rowcount
+    else:
+        updated = connection.execute(
+            select(STATS_TABLE.c.user_id).where(STATS_TABLE.c.user_id == user_id)
+        ).first() is not None
+    if updated:
+        return
+
+    values = count_activity(connection, user_id)
+    for column, delta in counts.items():
+        values[column] += delta
+    if not insert_if_absent(connection, STATS_TABLE, {'user_id': user_id, **values}):
+        # Another writer created the row first
+        increment_stats(connection, user_id, counts)
+
+def record_bulk_activity(session, user_id, counts):
+    """Account for activity rows inserted outside the ORM unit of work.
+
+    Call it in the same transaction, before the rows are inserted, so a
+    first-time backfill does not count them twice.
+    """
+    increment_stats(session.connection(), user_id, counts)
+    session.info.setdefault('dashboard_users', set()).add(user_id)
+
+def load_user_stats(user_id):
+    """Return a user's activity counters, backfilling the row if needed"""
+    stats = db.session.get(UserStats, user_id)
+    if stats is None:
+        increment_stats(db.session.connection(), user_id, {})
+        db.session.commit()
+        stats = db.session.get(UserStats, user_id)
+    return {
+        'detections': stats.detections,
+        'weather_queries': stats.weather_queries,
+        'chat_messages': stats.chat_messages,
+        'crop_care_queries': stats.crop_care_queries
+    }
+
+class DashboardCache:
+    """Short-lived per-user cache of dashboard data.
+
+    Entries expire after ``ttl`` seconds and are dropped as soon as a
+    transaction that wrote the user's activity commits.
+    """
+
+    def __init__(self, ttl=30, max_entries=10000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'invalidations': 0}
+
+    def get(self, user_id):
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and time.monotonic() - entry[0] < self.ttl:
+                self._entries.move_to_end(user_id)
+                self._stats['hits'] += 1
+                return entry[1]
+            self._stats['misses'] += 1
+            return None
+
+    def set(self, user_id, data):
+        with self._lock:
+            self._entries[user_id] = (time.monotonic(), data)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, user_ids):
+        with self._lock:
+            for user_id in user_ids:
+                if self._entries.pop(user_id, None) is not None:
+                    self._stats['invalidations'] += 1
+
+    def get_metrics(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['entries'] = len(self._entries)
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = stats['hits'] / lookups if lookups else 0.0
+        return stats
+
+def track_activity(session, dashboard_cache):
+    """Keep UserStats counters and ``dashboard_cache`` in step with ORM writes.
+
+    New activity rows bump their user's counters inside the same flush, so
+    counters commit or roll back with the rows themselves. Rows written with
+    Core bulk inserts bypass the session and must call
+    ``record_bulk_activity``.
+    """
+
+    @event.listens_for(session, 'before_flush')
+    def count_new_activity(session, flush_context, instances):
+        increments = defaultdict(Counter)
+        touched = session.info.setdefault('dashboard_users', set())
+        for obj in session.new:
+            column = COUNTED_MODELS.get(type(obj))
+            if column is not None:
+                increments[obj.user_id][column] += 1
+            if isinstance(obj, DASHBOARD_MODELS):
+                touched.add(obj.user_id)
+        for obj in session.dirty:
+            if isinstance(obj, DetectionJob):
+                touched.add(obj.user_id)
+        if increments:
+            connection = session.connection()
+            for user_id, counts in increments.items():
+                increment_stats(connection, user_id, counts)
+
+    @event.listens_for(session, 'after_commit')
+    def invalidate_dashboards(session):
+        touched = session.info.pop('dashboard_users', None)
+        if touched:
+            dashboard_cache.invalidate(touched)
+
+    @event.listens_for(session, 'after_rollback')
+    def forget_dashboards(session):
+        session.info.pop('dashboard_users', None)
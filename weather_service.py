@@ -1,30 +1,196 @@
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import logging
+import numpy as np
 import os
-from datetime import datetime
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime, timezone
+from advice_rules import RuleSet, load_rules
 
 # OpenWeatherMap API configuration
 API_KEY = os.environ.get("OPENWEATHER_API_KEY", "YOUR_HARDCODED_OPENWEATHER_API_KEY")
-BASE_URL = "http://api.openweathermap.org/data/2.5"
+BASE_URL = os.environ.get("OPENWEATHER_BASE_URL", "http://api.openweathermap.org/data/2.5")
+HTTP_TIMEOUT = float(os.environ.get("WEATHER_HTTP_TIMEOUT", 10))
+HTTP_RETRIES = int(os.environ.get("WEATHER_HTTP_RETRIES", 2))
 
-def get_weather_data(location):
-    """Get current weather data for a location"""
+# Cache lifetimes in seconds; stale entries are served while a refresh runs
+CURRENT_TTL = int(os.environ.get("WEATHER_CURRENT_TTL", 600))
+FORECAST_TTL = int(os.environ.get("WEATHER_FORECAST_TTL", 3600))
+STALE_TTL = int(os.environ.get("WEATHER_STALE_TTL", 1800))
+CACHE_SIZE = int(os.environ.get("WEATHER_CACHE_SIZE", 512))
+
+class WeatherCache:
+    """TTL cache with stale-while-revalidate and single-flight loading.
+
+    Fresh entries are returned directly. Entries past ``ttl`` but within
+    ``stale_ttl`` are returned immediately while one background refresh runs.
+    Concurrent misses for the same key wait on a single upstream call.
+    Failed loads (``None``) are never cached.
+    """
+
+    _refresh_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix='weather-refresh')
+
+    def __init__(self, ttl, stale_ttl=0, max_entries=512):
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'stale_hits': 0, 'misses': 0, 'coalesced': 0, 'refreshes': 0}
+
+    def get(self, key, loader):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, stored_at = entry
+                age = now - stored_at
+                if age < self.ttl:
+                    self._entries.move_to_end(key)
+                    self.stats['hits'] += 1
+                    return value
+                if age < self.ttl + self.stale_ttl:
+                    self.stats['stale_hits'] += 1
+                    if key not in self._inflight:
+                        self.stats['refreshes'] += 1
+                        self._inflight[key] = Future()
+                        self._refresh_pool.submit(self._load, key, loader)
+                    return value
+
+            future = self._inflight.get(key)
+            if future is None:
+                self.stats['misses'] += 1
+                self._inflight[key] = Future()
+            else:
+                self.stats['coalesced'] += 1
+        if future is not None:
+            return future.result()
+        return self._load(key, loader)
+
+    def _load(self, key, loader):
+        value = None
+        try:
+            value = loader()
+        except Exception as e:
+            logging.error(f"Error loading weather cache entry {key}: {e}")
+        with self._lock:
+            if value is not None:
+                self._entries[key] = (value, time.monotonic())
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+            future = self._inflight.pop(key, None)
+        if future is not None:
+            future.set_result(value)
+        return value
+
+# Farming advice rules, compiled once at startup
+RULES_PATH = os.environ.get("FARMING_RULES_PATH", os.path.join(os.path.dirname(__file__), 'farming_rules.json'))
+CROP_CARE_PATH = os.path.join(os.path.dirname(__file__), 'crop_care_data.json')
+
+try:
+    advice_rules = load_rules(RULES_PATH, CROP_CARE_PATH)
+except Exception as e:
+    logging.error(f"Error loading farming advice rules: {e}")
+    advice_rules = RuleSet([], default="🌾 Normal conditions: Continue with regular farming activities.")
+
+def reload_advice_rules():
+    """Recompile the advice rules, e.g. after the crop care data changed"""
+    global advice_rules
     try:
-        # Get current weather
-        current_url = f"{BASE_URL}/weather"
-        params = {
-            'q': location,
-            'appid': API_KEY,
-            'units': 'metric'
+        advice_rules = load_rules(RULES_PATH, CROP_CARE_PATH)
+    except Exception as e:
+        logging.error(f"Error reloading farming advice rules: {e}")
+
+current_cache = WeatherCache(CURRENT_TTL, STALE_TTL, CACHE_SIZE)
+forecast_cache = WeatherCache(FORECAST_TTL, STALE_TTL, CACHE_SIZE)
+
+def create_session():
+    """Create a keep-alive HTTP session that retries transient upstream failures"""
+    retries = Retry(
+        total=HTTP_RETRIES,
+        backoff_factor=0.3,
+        status_forcelist=(429, 500, 502, 503, 504),
+        allowed_methods=frozenset(['GET'])
+    )
+    adapter = HTTPAdapter(pool_connections=2, pool_maxsize=16, max_retries=retries)
+    http = requests.Session()
+    http.mount('http://', adapter)
+    http.mount('https://', adapter)
+    return http
+
+# Shared connection pool for all OpenWeatherMap calls
+session = create_session()
+
+# Runs the forecast call alongside the current-conditions call
+_fetch_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix='weather-fetch')
+
+_timings = {}
+_timings_lock = threading.Lock()
+
+def call_api(endpoint, location):
+    """GET an OpenWeatherMap endpoint through the shared session, recording its latency"""
+    params = {
+        'q': location,
+        'appid': API_KEY,
+        'units': 'metric'
+    }
+    started = time.perf_counter()
+    try:
+        return session.get(f"{BASE_URL}/{endpoint}", params=params, timeout=HTTP_TIMEOUT)
+    finally:
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        logging.debug(f"Weather API /{endpoint} for {location!r} took {elapsed_ms:.0f} ms")
+        with _timings_lock:
+            timing = _timings.setdefault(endpoint, {'calls': 0, 'total_ms': 0.0, 'max_ms': 0.0})
+            timing['calls'] += 1
+            timing['total_ms'] += elapsed_ms
+            timing['max_ms'] = max(timing['max_ms'], elapsed_ms)
+
+def normalize_location(location):
+    """Normalize a location query so equivalent spellings share a cache entry.
+
+    Case and whitespace are folded and comma-separated parts are trimmed,
+    so "  New  Delhi , IN" and "new delhi,in" produce the same key.
+    """
+    parts = [re.sub(r'\s+', ' ', part).strip() for part in location.lower().split(',')]
+    return ','.join(part for part in parts if part)
+
+def get_cache_stats():
+    """Return cache hit/miss counters and upstream call latencies"""
+    with _timings_lock:
+        upstream = {
+            endpoint: dict(timing, avg_ms=timing['total_ms'] / timing['calls'])
+            for endpoint, timing in _timings.items()
         }
+    return {'current': dict(current_cache.stats), 'forecast': dict(forecast_cache.stats), 'upstream': upstream}
+
+def fetch_current_weather(location):
+    """Fetch raw current conditions from OpenWeatherMap, or None on failure"""
+    response = call_api('weather', location)
+    
+    if response.status_code == 200:
+        return response.json()
+    logging.error(f"Weather API error: {response.status_code}")
+    return None
+
+def get_weather_data(location, crop=None):
+    """Get current weather data for a location, with advice tailored to an optional crop"""
+    try:
+        key = normalize_location(location)
         
-        response = requests.get(current_url, params=params, timeout=10)
+        # Fetch the forecast concurrently with current conditions
+        forecast_future = _fetch_pool.submit(get_forecast_data, key)
+        data = current_cache.get(key, lambda: fetch_current_weather(key))
         
-        if response.status_code == 200:
-            data = response.json()
-            
-            # Get forecast data
-            forecast_data = get_forecast_data(location)
+        if data is not None:
+            forecast_data = forecast_future.result()
             
             weather_info = {
                 'location': data['name'],
@@ -45,11 +211,10 @@ def get_weather_data(location):
             }
             
             # Add agricultural recommendations
-            weather_info['farming_advice'] = get_farming_advice(weather_info)
+            weather_info['farming_advice'] = get_farming_advice(weather_info, crop)
             
             return weather_info
         else:
-            logging.error(f"Weather API error: {response.status_code}")
             return None
             
     except requests.exceptions.RequestException as e:
@@ -61,76 +226,91 @@ def get_weather_data(location):
 
 def get_forecast_data(location):
     """Get 5-day weather forecast"""
+    key = normalize_location(location)
+    return forecast_cache.get(key, lambda: fetch_forecast_data(key)) or []
+
+def fetch_forecast_data(location):
+    """Fetch and summarize the 5-day forecast, or None on failure"""
     try:
-        forecast_url = f"{BASE_URL}/forecast"
-        params = {
-            'q': location,
-            'appid': API_KEY,
-            'units': 'metric'
-        }
-        
-        response = requests.get(forecast_url, params=params, timeout=10)
+        response = call_api('forecast', location)
         
         if response.status_code == 200:
             data = response.json()
-            forecast = []
-            
-            # Get daily forecasts (every 24 hours)
-            for i in range(0, min(len(data['list']), 40), 8):  # Every 8th item (24 hours)
-                item = data['list'][i]
-                forecast.append({
-                    'date': datetime.fromtimestamp(item['dt']).strftime('%Y-%m-%d'),
-                    'day': datetime.fromtimestamp(item['dt']).strftime('%A'),
-                    'temperature': round(item['main']['temp']),
-                    'description': item['weather'][0]['description'].title(),
-                    'icon': item['weather'][0]['icon'],
-                    'humidity': item['main']['humidity'],
-                    'wind_speed': item['wind']['speed']
-                })
-            
-            return forecast[:5]  # Return max 5 days
+            tz_offset = data.get('city', {}).get('timezone', 0)
+            return aggregate_forecast(data['list'][:40], tz_offset)[:5]  # Return max 5 days
         else:
-            return []
+            return None
             
     except Exception as e:
         logging.error(f"Error fetching forecast data: {e}")
-        return []
+        return None
 
-def get_farming_advice(weather_data):
-    """Generate farming advice based on weather conditions"""
-    advice = []
-    temp = weather_data['temperature']
-    humidity = weather_data['humidity']
-    wind_speed = weather_data['wind_speed']
-    description = weather_data['description'].lower()
-    
-    # Temperature-based advice
-    if temp < 5:
-        advice.append("⚠️ Frost risk: Protect sensitive plants and consider covering crops.")
-    elif temp > 35:
-        advice.append("🌡️ High temperature: Increase watering frequency and provide shade for sensitive plants.")
-    elif 15 <= temp <= 25:
-        advice.append("🌱 Ideal growing conditions: Good time for planting and outdoor activities.")
-    
-    # Humidity-based advice
-    if humidity > 80:
-        advice.append("💧 High humidity: Monitor for fungal diseases and ensure good air circulation.")
-    elif humidity < 30:
-        advice.append("🏜️ Low humidity: Increase irrigation and consider mulching to retain moisture.")
+# 3-hourly forecast slots in a complete local day
+FULL_DAY_SLOTS = 8
+
+def aggregate_forecast(slots, tz_offset=0):
+    """Summarize 3-hourly forecast slots into per-day statistics.
+
+    Slots are grouped by local calendar day using the city's UTC offset in
+    seconds. Each day reports min/max/mean temperature, total precipitation,
+    maximum wind speed and peak humidity; the description and icon come from
+    the slot closest to local noon. The rest of today and the last day of
+    the forecast usually cover only part of the day; those are marked
+    ``partial`` (with their ``slots`` count) and left out of the advice rules.
+    """
+    if not slots:
+        return []
     
-    # Wind-based advice
-    if wind_speed > 10:
-        advice.append("💨 Strong winds: Secure tall plants and protect greenhouse structures.")
+    count = len(slots)
+    local_time = np.fromiter((item['dt'] for item in slots), dtype=np.int64, count=count) + tz_offset
+    temp = np.fromiter((item['main']['temp'] for item in slots), dtype=np.float64, count=count)
+    temp_min = np.fromiter((item['main'].get('temp_min', item['main']['temp']) for item in slots),
+                           dtype=np.float64, count=count)
+    temp_max = np.fromiter((item['main'].get('temp_max', item['main']['temp']) for item in slots),
+                           dtype=np.float64, count=count)
+    humidity = np.fromiter((item['main']['humidity'] for item in slots), dtype=np.float64, count=count)
+    wind_speed = np.fromiter((item['wind']['speed'] for item in slots), dtype=np.float64, count=count)
+    precipitation = np.fromiter(
+        ((item.get('rain') or {}).get('3h', 0) + (item.get('snow') or {}).get('3h', 0) for item in slots),
+        dtype=np.float64, count=count
+    )
     
-    # Weather condition advice
-    if 'rain' in description:
-        advice.append("🌧️ Rainy conditions: Good for soil moisture but watch for waterlogging.")
-    elif 'clear' in description or 'sunny' in description:
-        advice.append("☀️ Clear skies: Excellent for field work and harvesting activities.")
-    elif 'cloud' in description:
-        advice.append("☁️ Cloudy conditions: Good for transplanting as plants face less stress.")
+    # Forecast slots are time-ordered, so each local day is a contiguous run
+    day_number = local_time // 86400
+    days, starts, day_counts = np.unique(day_number, return_index=True, return_counts=True)
+    daily_min = np.minimum.reduceat(temp_min, starts)
+    daily_max = np.maximum.reduceat(temp_max, starts)
+    daily_mean = np.add.reduceat(temp, starts) / day_counts
+    daily_precipitation = np.add.reduceat(precipitation, starts)
+    daily_wind = np.maximum.reduceat(wind_speed, starts)
+    daily_humidity = np.maximum.reduceat(humidity, starts)
+    distance_from_noon = np.abs(local_time % 86400 - 43200)
     
-    return advice if advice else ["🌾 Normal conditions: Continue with regular farming activities."]
+    forecast = []
+    for i, day in enumerate(days):
+        start = starts[i]
+        noon_slot = slots[start + int(np.argmin(distance_from_noon[start:start + day_counts[i]]))]
+        date = datetime.fromtimestamp(int(day) * 86400, tz=timezone.utc)
+        forecast.append({
+            'date': date.strftime('%Y-%m-%d'),
+            'day': date.strftime('%A'),
+            'temperature': round(daily_mean[i]),
+            'temp_min': round(daily_min[i]),
+            'temp_max': round(daily_max[i]),
+            'temp_mean': round(float(daily_mean[i]), 1),
+            'precipitation': round(float(daily_precipitation[i]), 1),
+            'description': noon_slot['weather'][0]['description'].title(),
+            'icon': noon_slot['weather'][0]['icon'],
+            'humidity': int(daily_humidity[i]),
+            'wind_speed': round(float(daily_wind[i]), 1),
+            'slots': int(day_counts[i]),
+            'partial': bool(day_counts[i] < FULL_DAY_SLOTS)
+        })
+    return forecast
+
+def get_farming_advice(weather_data, crop=None):
+    """Generate farming advice based on current conditions and the daily forecast"""
+    return advice_rules.evaluate(weather_data, crop)
 
 def get_weather_icon_url(icon_code):
     """Get weather icon URL from OpenWeatherMap"""